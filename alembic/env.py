@@ -13,7 +13,7 @@ DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NA
 from sqlalchemy import engine_from_config, pool
 from sqlalchemy import MetaData
 from alembic import context
-from app.database import engine, Base  # Your engine and Base from database.py
+from app.models import Base  # The app itself runs on an async engine, migrations use a sync psycopg2 one
 
 config = context.config
 target_metadata = Base.metadata
@@ -21,7 +21,11 @@ target_metadata = Base.metadata
 config.set_section_option('alembic', 'sqlalchemy.url', DATABASE_URL)
 
 def run_migrations_online():
-    connectable = engine
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
 
     with connectable.connect() as connection:
         context.configure(
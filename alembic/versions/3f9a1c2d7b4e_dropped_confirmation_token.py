@@ -0,0 +1,30 @@
+"""dropped confirmation token
+
+Revision ID: 3f9a1c2d7b4e
+Revises: c888178d19c1
+Create Date: 2026-10-18 12:04:31.218554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b4e'
+down_revision: Union[str, None] = 'c888178d19c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Confirmation tokens are stateless HMACs now, the column and its unique index go away
+    op.drop_column('users', 'confirmation_token')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('users', sa.Column('confirmation_token', sa.String(), nullable=True))
+    op.create_unique_constraint('users_confirmation_token_key', 'users', ['confirmation_token'])
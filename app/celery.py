@@ -1,7 +1,7 @@
 from celery import Celery
 from app.config import CELERY_BROKER_URL
 
-celery = Celery('app', broker=CELERY_BROKER_URL)
+celery = Celery('app', broker=CELERY_BROKER_URL, include=['email_tasks.tasks'])
 
 celery.conf.update(
     task_serializer='json',
@@ -0,0 +1,54 @@
+import sys
+import json
+import asyncio
+import argparse
+from app.config import BULK_IMPORT_CHUNK_SIZE
+from app.utlis.bulk_import import iter_lines, iter_rows, import_users
+from app.database import create_database, create_schema, dispose_engine
+from app.utlis.hashing import setup_password_hashing
+
+
+async def _read_chunks(path: str, size: int = 64 * 1024):
+    with open(path, "rb") as file:
+        while chunk := file.read(size):
+            yield chunk
+
+
+async def _import(args):
+    counts = {"created": 0, "duplicate": 0, "error": 0}
+    rows = iter_rows(iter_lines(_read_chunks(args.file)), args.format)
+    try:
+        async for result in import_users(rows, chunk_size=args.chunk_size):
+            counts[result["status"]] += 1
+            sys.stdout.write(json.dumps(result) + "\n")
+    finally:
+        await dispose_engine()
+    print(f"Imported: {counts['created']}, duplicates: {counts['duplicate']}, errors: {counts['error']}",
+          file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import-users", help="Bulk import users from an NDJSON or CSV file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    import_parser.add_argument("--chunk-size", type=int, default=BULK_IMPORT_CHUNK_SIZE)
+
+    commands.add_parser("init-db", help="Create the database and tables if missing, for the first deploy")
+
+    args = parser.parse_args(argv)
+    if args.command == "import-users":
+        setup_password_hashing()
+        asyncio.run(_import(args))
+    elif args.command == "init-db":
+        create_database()
+        if create_schema():
+            print("Schema created and stamped at the alembic head", file=sys.stderr)
+        else:
+            print("Schema exists, run `alembic upgrade head` to migrate it", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
-import logging
-from termcolor import colored
+import hashlib
+from .logs import setup_logger
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,30 +8,12 @@ load_dotenv()
 """
 # Logger
 """
-class ColoredFormatter(logging.Formatter):
-    COLORS = {
-        'DEBUG': 'cyan',
-        'INFO': 'green',
-        'WARNING': 'yellow',
-        'ERROR': 'red',
-        'CRITICAL': 'magenta',
-    }
 
-    def format(self, record):
-        log_message = super().format(record)
-        return colored(log_message, self.COLORS.get(record.levelname, 'white'))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))  # Share of high volume events (extra=SAMPLED) kept
 
-def setup_logger():
-    logger = logging.getLogger("my_logger")
-    logger.setLevel(logging.DEBUG)
-
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(ColoredFormatter('%(asctime)s - %(levelname)s: %(message)s'))
-
-    logger.addHandler(console_handler)
-    return logger
-
-logger = setup_logger()
+logger = setup_logger(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE)
 
 """
 # App
@@ -40,6 +22,14 @@ logger = setup_logger()
 DEBUG = os.getenv("DEBUG", False)
 SERVER = os.getenv("SERVER", "127.0.0.1")
 SERVER_PORT = os.getenv("SERVER_PORT", "8000")
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 0))  # Worker processes for app.server, 0 = one per available CPU (1 with memory backends)
+SERVER_LOOP = os.getenv("SERVER_LOOP", "auto")  # "auto" picks uvloop when it's installed
+SERVER_HTTP = os.getenv("SERVER_HTTP", "auto")  # "auto" picks httptools when it's installed
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", 2048))
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", 75))  # Seconds, above the load balancer's idle timeout
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", 0))  # Per worker, 503 beyond it, 0 = unlimited
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "False").lower() in ("1", "true", "yes")
+SERVER_PROXY_HEADERS = os.getenv("SERVER_PROXY_HEADERS", "False").lower() in ("1", "true", "yes")
 
 """
 # Database configuration
@@ -51,6 +41,23 @@ DB_USER = os.getenv("DB_USER", "auth_service_user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "your_password")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Seconds, -1 disables recycling
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", 2))  # Opened per worker on startup, capped at DB_POOL_SIZE
+DB_WARMUP_JITTER_SECONDS = float(os.getenv("DB_WARMUP_JITTER_SECONDS", 1.0))  # Random delay before the warm-up
+
+# Read replicas: comma separated URLs, postgresql:// ones are switched to asyncpg. Empty = everything on the primary
+DB_REPLICA_URLS = [url.strip().replace("postgresql://", "postgresql+asyncpg://", 1)
+                   for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_POLICY = os.getenv("DB_REPLICA_POLICY", "round_robin")  # "round_robin" or "least_connections"
+DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", DB_POOL_SIZE))
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", 5))  # Seconds between health checks
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 5))  # Replicas further behind are ejected
 
 """
 # Email Configuration
@@ -60,11 +67,37 @@ SMTP_PORT = os.getenv("SMTP_PORT", None)
 SMTP_FROM = os.getenv("SMTP_FROM", None)
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", None)
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", None)
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "True").lower() in ("1", "true", "yes")  # Off for a local debug server
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))  # Connections kept open per worker process
+SMTP_MAX_IDLE_SECONDS = int(os.getenv("SMTP_MAX_IDLE_SECONDS", 240))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 500))
+
+SEND_CONFIRMATION_EMAILS = os.getenv("SEND_CONFIRMATION_EMAILS", "False").lower() in ("1", "true", "yes")
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))  # Emails per send_confirmation_emails task
+EMAIL_BATCH_WINDOW_MS = int(os.getenv("EMAIL_BATCH_WINDOW_MS", 200))  # Max wait before a partial batch is sent
+EMAIL_RATE_LIMIT_PER_SECOND = float(os.getenv("EMAIL_RATE_LIMIT_PER_SECOND", 10))  # Per SMTP provider, 0 = unlimited
+EMAIL_RATE_LIMIT_BACKEND = os.getenv("EMAIL_RATE_LIMIT_BACKEND", "redis")  # "redis" (shared by all workers) or "memory" (per worker process)
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", 5))
+EMAIL_RETRY_BACKOFF_SECONDS = int(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", 30))  # Doubled on every attempt
 
 """
 # Celery
 """
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379")
+EMAIL_RATE_LIMIT_REDIS_URL = os.getenv("EMAIL_RATE_LIMIT_REDIS_URL", CELERY_BROKER_URL)
+
+"""
+# User cache
+"""
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")  # "memory", "redis" or "none"
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL", CELERY_BROKER_URL)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))  # Entries, memory backend only
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+USER_CACHE_NEGATIVE_TTL = int(os.getenv("USER_CACHE_NEGATIVE_TTL", 60))  # Unknown emails
+# Concurrent lookups of the same user share one query, per worker process
+USER_LOOKUP_COALESCE = os.getenv("USER_LOOKUP_COALESCE", "True").lower() in ("1", "true", "yes")
+USER_LOOKUP_MAX_WAITERS = int(os.getenv("USER_LOOKUP_MAX_WAITERS", 1000))  # Callers beyond this query on their own
+USER_LOOKUP_WAIT_TIMEOUT = float(os.getenv("USER_LOOKUP_WAIT_TIMEOUT", 2))  # Seconds before a waiter queries on its own
 
 """
 # Security
@@ -72,5 +105,50 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY", "your_private_key_here")
 PUBLIC_KEY = os.getenv("PUBLIC_KEY", "your_public_key_here")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")
+JWT_KID = os.getenv("JWT_KID", None)  # Key id of PRIVATE_KEY, derived from PUBLIC_KEY when unset
+JWT_PUBLIC_KEYS_DIR = os.getenv("JWT_PUBLIC_KEYS_DIR", None)  # <kid>.pem files of retired keys still accepted
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", 3600))
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "memory")  # "memory" or "redis" (shared between workers)
+REVOCATION_REDIS_URL = os.getenv("REVOCATION_REDIS_URL", CELERY_BROKER_URL)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+# Email confirmation tokens are HMACs, the secret defaults to one derived from the private key
+EMAIL_CONFIRMATION_SECRET = os.getenv("EMAIL_CONFIRMATION_SECRET", "").encode() or \
+    hashlib.sha256(b"email-confirmation:" + PRIVATE_KEY.encode()).digest()
+EMAIL_CONFIRMATION_EXPIRE_HOURS = int(os.getenv("EMAIL_CONFIRMATION_EXPIRE_HOURS", 24))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))  # Verified tokens kept in memory, 0 disables
+INTROSPECT_API_KEY = os.getenv("INTROSPECT_API_KEY", None)  # POST /auth/introspect is disabled when unset
+INTROSPECT_MAX_TOKENS = int(os.getenv("INTROSPECT_MAX_TOKENS", 500))  # Per request
+INTROSPECT_EXECUTOR = os.getenv("INTROSPECT_EXECUTOR", "thread")  # "thread" or "process"
+INTROSPECT_WORKERS = int(os.getenv("INTROSPECT_WORKERS", os.cpu_count() or 1))
+INTROSPECT_PARALLEL_MIN = int(os.getenv("INTROSPECT_PARALLEL_MIN", 8))  # Fewer uncached tokens are verified inline
+
+"""
+# Password hashing
+"""
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")  # "thread" or "process"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 64))  # Waiting hashes before answering 503
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", 1))
+HASH_TARGET_MS = int(os.getenv("HASH_TARGET_MS", 250))  # Per-hash latency budget the bcrypt cost is calibrated to
+HASH_ROUNDS = int(os.getenv("HASH_ROUNDS", 0))  # Fixed bcrypt cost, 0 = calibrate on startup
+HASH_MIN_ROUNDS = int(os.getenv("HASH_MIN_ROUNDS", 10))  # Security floor, never calibrated below it
+HASH_MAX_ROUNDS = int(os.getenv("HASH_MAX_ROUNDS", 16))
+
+"""
+# Rate limiting, "<requests>/<seconds>", "0" disables
+"""
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis" (shared between workers)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", CELERY_BROKER_URL)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "False").lower() in ("1", "true", "yes")
+RATE_LIMIT_TRUSTED_PROXY_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", 1))  # Proxies appending to X-Forwarded-For
+LOGIN_RATE_LIMIT_PER_IP = os.getenv("LOGIN_RATE_LIMIT_PER_IP", "20/60")
+LOGIN_RATE_LIMIT_PER_EMAIL = os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", "10/60")
+LOGIN_RATE_LIMIT_GLOBAL = os.getenv("LOGIN_RATE_LIMIT_GLOBAL", "0")  # Set to about what the hashing pool can verify
+
+"""
+# Admin
+"""
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", None)  # Admin endpoints are disabled when unset
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", 500))
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", os.cpu_count() or 1))
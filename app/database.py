@@ -1,22 +1,301 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session  # Make sure Session is imported
-from .models import Base
+import time
+import random
+import asyncio
+import itertools
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
-import psycopg2
-from psycopg2 import sql
-from .config import DATABASE_URL, logger
+from .config import (DATABASE_URL,
+                     ASYNC_DATABASE_URL,
+                     DB_POOL_SIZE,
+                     DB_MAX_OVERFLOW,
+                     DB_POOL_PRE_PING,
+                     DB_POOL_RECYCLE,
+                     DB_POOL_TIMEOUT,
+                     DB_WARMUP_CONNECTIONS,
+                     DB_WARMUP_JITTER_SECONDS,
+                     DB_REPLICA_URLS,
+                     DB_REPLICA_POLICY,
+                     DB_REPLICA_POOL_SIZE,
+                     DB_REPLICA_HEALTH_INTERVAL,
+                     DB_REPLICA_MAX_LAG_SECONDS,
+                     logger)
+from .metrics import observe_stage, STAGE_ERRORS
 
+"""
+# Engine
+# Nothing connects at import time, the engine is built on first use and warmed up on app startup.
+# Creating the database and the schema is an explicit step: `python -m app.cli init-db`, then Alembic.
+"""
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_engine = None
+_sessionmaker = None
+pool_warm = False
 
-db_url = DATABASE_URL
-db_url_parts = db_url.split("/")
-db_name = db_url_parts[-1]
-db_url_base = "/".join(db_url_parts[:-1])
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    # One value, not a stack: a connection runs one statement at a time and a failed one never reaches
+    # after_cursor_execute, the next start simply overwrites it
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start", None)
+    if start is not None:
+        observe_stage("db_query", start)
+
+
+def _query_failed(exception_context):
+    conn = exception_context.connection
+    if conn is None or conn.invalidated:
+        return
+    if conn.info.pop("query_start", None) is not None:
+        STAGE_ERRORS.labels("db_query").inc()
+
+
+def _instrument(engine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _query_started)
+    event.listen(engine.sync_engine, "after_cursor_execute", _query_finished)
+    event.listen(engine.sync_engine, "handle_error", _query_failed)
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        _instrument(_engine)
+    return _engine
+
+
+def get_sessionmaker():
+    global _sessionmaker
+    if _sessionmaker is None:
+        # expire_on_commit=False keeps loaded attributes usable after commit without an implicit (sync) reload
+        _sessionmaker = async_sessionmaker(bind=get_engine(), autoflush=False, expire_on_commit=False)
+    return _sessionmaker
+
+
+def pool_status():
+    """None until the engine exists"""
+    if _engine is None:
+        return None
+    pool = _engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+async def _open_connection(engine):
+    conn = await engine.connect()
+    try:
+        await conn.execute(text("SELECT 1"))
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
+async def warm_up(connections: int = DB_WARMUP_CONNECTIONS, jitter: float = DB_WARMUP_JITTER_SECONDS,
+                  max_backoff: float = 30.0):
+    """
+    Opens `connections` pooled connections at once and hands them back idle, so the first requests
+    don't pay for the TCP and auth handshakes. Retries with backoff until the database answers.
+    """
+    global pool_warm
+    if jitter:
+        # Spread out pods that start together instead of hitting Postgres all at once
+        await asyncio.sleep(random.uniform(0, jitter))
+
+    engine = get_engine()
+    connections = max(min(connections, DB_POOL_SIZE), 1)
+    backoff = 0.5
+    while True:
+        results = await asyncio.gather(*(_open_connection(engine) for _ in range(connections)),
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for result in results:
+            if not isinstance(result, BaseException):
+                await result.close()  # Back to the pool, still open
+        if not errors:
+            pool_warm = True
+            logger.info("Database pool warm with %d connections", connections)
+            return
+        logger.error("Database warm-up failed, retrying in %.1fs: %s", backoff, errors[0])
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, max_backoff)
+
+
+async def dispose_engine():
+    global _engine, _sessionmaker, pool_warm
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = _sessionmaker = None
+    pool_warm = False
+
+
+async def get_db() -> AsyncSession:
+    """Database session generator"""
+    async with get_sessionmaker()() as db:
+        yield db
+
+
+"""
+# Read replicas
+# Read-only lookups go to a healthy replica, everything else to the primary. A replica is ejected when a query
+# on it fails or it lags more than DB_REPLICA_MAX_LAG_SECONDS, the health check lets it back in once it's fine.
+"""
+
+# Replay lag in seconds, 0 when everything received is replayed (an idle primary isn't lag)
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.healthy = True
+        self.lag = 0.0
+        self.ejections = 0
+        self._engine = None
+        self._sessionmaker = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_async_engine(
+                self.url,
+                pool_size=DB_REPLICA_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+            _instrument(self._engine)
+        return self._engine
+
+    @property
+    def sessionmaker(self):
+        if self._sessionmaker is None:
+            self._sessionmaker = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False,
+                                                    info={"replica": self.name})
+        return self._sessionmaker
+
+    @property
+    def connections(self) -> int:
+        return self._engine.pool.checkedout() if self._engine is not None else 0
+
+    def status(self) -> dict:
+        return {"healthy": self.healthy, "lag_seconds": self.lag, "checked_out": self.connections,
+                "ejections": self.ejections}
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+        self._engine = self._sessionmaker = None
+
+
+class ReplicaRouter:
+    def __init__(self, urls, policy: str = "round_robin", health_interval: float = 5, max_lag: float = 5):
+        # Named by position, the URLs carry credentials and don't belong in logs or metrics
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls)]
+        self.policy = policy
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self._task = None
+
+    def choose(self):
+        """A healthy replica, None when there is none (or none configured) and the primary has to serve"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.policy == "least_connections":
+            return min(healthy, key=lambda replica: replica.connections)
+        return healthy[next(self._counter) % len(healthy)]
+
+    def eject(self, name: str, reason):
+        for replica in self.replicas:
+            if replica.name == name and replica.healthy:
+                replica.healthy = False
+                replica.ejections += 1
+                logger.warning("Ejected %s: %s", name, reason)
+
+    async def _read_lag(self, replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            return float(await conn.scalar(REPLICA_LAG_QUERY) or 0)
+
+    async def check(self, replica: Replica):
+        try:
+            # Bounded, an unreachable host would otherwise hold the check for asyncpg's 60s connect timeout
+            replica.lag = await asyncio.wait_for(self._read_lag(replica), timeout=max(self.health_interval, 1))
+        except Exception as e:
+            self.eject(replica.name, e)
+            return
+        if replica.lag > self.max_lag:
+            self.eject(replica.name, f"{replica.lag:.1f}s behind")
+        elif not replica.healthy:
+            replica.healthy = True
+            logger.info("%s is healthy again", replica.name)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def status(self) -> dict:
+        return {replica.name: replica.status() for replica in self.replicas}
+
+
+replica_router = ReplicaRouter(DB_REPLICA_URLS, DB_REPLICA_POLICY, DB_REPLICA_HEALTH_INTERVAL,
+                               DB_REPLICA_MAX_LAG_SECONDS)
+
+
+async def get_read_db() -> AsyncSession:
+    """
+    Session for read-only lookups, on a replica when one is healthy. Don't write through it and don't use it
+    right after a write, replicas lag behind the primary.
+    """
+    replica = replica_router.choose()
+    sessionmaker = replica.sessionmaker if replica is not None else get_sessionmaker()
+    async with sessionmaker() as db:
+        yield db
+
+
+def replica_name(db) -> str:
+    """Name of the replica the session reads from, None for the primary"""
+    return db.info.get("replica") if db is not None else None
 
 
 def create_database():
+    """Creates the database if it doesn't exist"""
+    import psycopg2
+    from psycopg2 import sql
+
+    db_name = DATABASE_URL.split("/")[-1]
     conn = None
     cursor = None
     try:
@@ -31,16 +310,16 @@ def create_database():
         cursor = conn.cursor()
 
         # Check if the target database exists
-        cursor.execute(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}'")
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
         exists = cursor.fetchone()
 
         if not exists:
             cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
-            logger.warning(f"Database '{db_name}' created successfully.")
+            logger.warning("Database '%s' created successfully.", db_name)
         else:
-            logger.info(f"Database '{db_name}' already exists.")
+            logger.info("Database '%s' already exists.", db_name)
     except Exception as e:
-        logger.error(f"Error creating database: {e}")
+        logger.error("Error creating database: %s", e)
     finally:
         if cursor:
             cursor.close()
@@ -48,18 +327,22 @@ def create_database():
             conn.close()
 
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def create_schema() -> bool:
+    """
+    Creates the tables on an empty database and stamps it at the Alembic head, the first migration
+    expects the users table to exist already. False if the schema was there, migrate it with Alembic.
+    """
+    from sqlalchemy import create_engine, inspect
+    from alembic import command
+    from alembic.config import Config
+    from .models import Base
 
-
-def get_db() -> Session:
-    """Database session generator"""
-    db = SessionLocal()
+    engine = create_engine(DATABASE_URL)
     try:
-        yield db
+        if inspect(engine).has_table("users"):
+            return False
+        Base.metadata.create_all(engine)
     finally:
-        db.close()
-
-
-create_database()  # Creates the database if it doesn't exist
-create_tables()  # Creates the tables based on models
\ No newline at end of file
+        engine.dispose()
+    command.stamp(Config("alembic.ini"), "head")
+    return True
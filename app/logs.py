@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+"""
+# Logging
+# Callers only put the record on a queue, JSON formatting and the write happen on a background thread.
+# Use lazy %-style arguments (logger.info("x %s", y)) so nothing is formatted when the level is disabled.
+"""
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has, anything else came in through extra= and is written as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_SKIPPED_FIELDS = _RECORD_ATTRS | {"sample"}
+
+# Opt-in for high volume events: logger.error("Cache read failed: %s", e, extra=SAMPLED)
+SAMPLED = {"sample": True}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _SKIPPED_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [{request_id}]" if request_id else line
+
+
+class ContextFilter(logging.Filter):
+    """Runs in the caller, stamps the request id and drops sampled events that lose the draw"""
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, "sample", False) and self.sample_rate < 1.0:
+            if random.random() >= self.sample_rate:
+                return False
+            record.sample_rate = self.sample_rate
+        request_id = request_id_var.get()
+        if request_id is not None:
+            record.request_id = request_id
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Only merge the arguments here, the formatter on the writer thread does the rest
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logger(level: str = "INFO", fmt: str = "json", sample_rate: float = 1.0):
+    logger = logging.getLogger("my_logger")
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(sample_rate))
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+
+    def restart_in_child():
+        # A forked worker (Celery prefork) inherits the queue but not the writer thread
+        new_queue = queue.SimpleQueue()
+        queue_handler.queue = new_queue
+        listener.queue = new_queue
+        listener._thread = None
+        listener.start()
+
+    os.register_at_fork(after_in_child=restart_in_child)
+    atexit.register(listener.stop)  # Flushes what is still queued
+
+    logger.addHandler(queue_handler)
+    return logger
+
+
+"""
+# Request ids
+"""
+
+class RequestIdMiddleware:
+    """Takes X-Request-ID from the caller or makes one, binds it for logging and echoes it on the response"""
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -1,6 +1,67 @@
-from fastapi import FastAPI
-from .routes import auth, users
-app = FastAPI()
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+from .routes import auth, users, admin, well_known, health
+import asyncio
+from .database import warm_up, dispose_engine, replica_router
+from .utlis.hashing import hashing_executor, setup_password_hashing
+from .utlis.tokens import get_token_service
+from .utlis.token_cache import token_cache
+from .utlis.user_cache import user_cache
+from .utlis.email_batcher import email_batcher
+from .utlis.introspection import token_introspector
+from .metrics import MetricsMiddleware, metrics_response_body
+from .logs import RequestIdMiddleware
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)  # Outermost, so everything below logs with the request id
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
-app.include_router(users.router, prefix="/users", tags=["users"])
\ No newline at end of file
+app.include_router(users.router, prefix="/users", tags=["users"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.include_router(well_known.router, prefix="/.well-known", tags=["keys"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+
+
+@app.on_event("startup")
+async def on_startup():
+    get_token_service()  # Parses and validates the signing keys once, fails fast on a bad PEM
+    setup_password_hashing()  # Fixed or calibrated bcrypt cost, before the first request hashes anything
+    # In the background so the worker starts serving liveness checks, /health/ready turns 200 once it's done
+    app.state.warmup_task = asyncio.create_task(warm_up())
+    replica_router.start()  # Health checks of the read replicas, if any are configured
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.warmup_task.cancel()
+    await email_batcher.close()  # Hand the last partial batch to Celery
+    hashing_executor.shutdown()
+    token_introspector.shutdown()
+    await replica_router.stop()
+    await dispose_engine()
+
+
+@app.get("/metrics", tags=["metrics"], include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics_response_body()
+    return Response(content=body, headers={"Content-Type": content_type})  # Already carries the charset
+
+
+@app.get("/metrics/hashing", tags=["metrics"])
+async def hashing_metrics():
+    return hashing_executor.metrics()
+
+
+@app.get("/metrics/token-cache", tags=["metrics"])
+async def token_cache_metrics():
+    return token_cache.metrics()
+
+
+@app.get("/metrics/user-cache", tags=["metrics"])
+async def user_cache_metrics():
+    return user_cache.metrics()
+
+
+@app.get("/metrics/email", tags=["metrics"])
+async def email_metrics():
+    return email_batcher.metrics()
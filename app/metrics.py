@@ -0,0 +1,170 @@
+import os
+import time
+from prometheus_client import (Histogram, Counter, CollectorRegistry, REGISTRY, generate_latest, multiprocess,
+                               CONTENT_TYPE_LATEST)
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+"""
+# Prometheus metrics
+# Label children are bound once at import, an observation is a perf_counter() pair plus one histogram
+# update (a few microseconds), cheap enough to leave on in production.
+"""
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+STAGE_LATENCY = Histogram(
+    "auth_stage_duration_seconds",
+    "Latency of internal stages of the request path",
+    ["stage"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+STAGE_ERRORS = Counter("auth_stage_errors_total", "Failed internal stages", ["stage"])
+
+STAGES = ("jwt_verify", "token_sign", "db_query", "bcrypt_hash", "bcrypt_verify", "celery_enqueue")
+_stage = {name: STAGE_LATENCY.labels(name) for name in STAGES}
+
+
+def observe_stage(stage: str, start: float):
+    """Records time.perf_counter() - start for the stage"""
+    _stage[stage].observe(time.perf_counter() - start)
+
+
+class timed_stage:
+    """Context manager version of observe_stage, also counts stages that raised"""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.stage, self.start)
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self.stage).inc()
+        return False
+
+
+"""
+# Request middleware
+"""
+
+class MetricsMiddleware:
+    """Pure ASGI so it doesn't add a BaseHTTPMiddleware task per request"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_paths(self, scope):
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path
+                for route in scope["app"].routes
+                if getattr(route, "endpoint", None) is not None
+            }
+        return self._routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router fills scope["endpoint"], map it back to the path template to keep label cardinality fixed
+            route = self._route_paths(scope).get(scope.get("endpoint"), "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status_code)).observe(time.perf_counter() - start)
+
+
+"""
+# Pool and cache state, read at scrape time
+"""
+
+class StateCollector:
+    def describe(self):
+        # Keeps register() from calling collect() at import time, before the modules it reads exist
+        return []
+
+    def collect(self):
+        from app.database import pool_status, replica_router
+        from app.utlis.hashing import hashing_executor
+        from app.utlis.token_cache import token_cache
+        from app.utlis.user_cache import user_cache
+
+        pool = pool_status()
+        if pool is not None:
+            db_pool = GaugeMetricFamily("db_pool_connections", "DB pool connections by state", labels=["state"])
+            for state in ("checked_out", "idle", "overflow", "size"):
+                db_pool.add_metric([state], pool[state])
+            yield db_pool
+
+        if replica_router.replicas:
+            healthy = GaugeMetricFamily("db_replica_healthy", "1 while the replica takes reads", labels=["replica"])
+            lag = GaugeMetricFamily("db_replica_lag_seconds", "Replay lag at the last health check", labels=["replica"])
+            for replica in replica_router.replicas:
+                healthy.add_metric([replica.name], int(replica.healthy))
+                lag.add_metric([replica.name], replica.lag)
+            yield healthy
+            yield lag
+
+        hashing = hashing_executor.metrics()
+        yield GaugeMetricFamily("hashing_in_flight", "Password hashes running or queued", value=hashing["in_flight"])
+        yield GaugeMetricFamily("hashing_queue_depth", "Password hashes waiting for a worker", value=hashing["queue_depth"])
+        yield CounterMetricFamily("hashing_rejected", "Hashes rejected with 503", value=hashing["rejected"])
+
+        for name, cache in (("token", token_cache), ("user", user_cache)):
+            stats = cache.metrics()
+            requests = CounterMetricFamily(f"{name}_cache_requests", f"{name} cache lookups", labels=["result"])
+            requests.add_metric(["hit"], stats["hits"])
+            requests.add_metric(["miss"], stats["misses"])
+            yield requests
+            yield GaugeMetricFamily(f"{name}_cache_hit_ratio", f"{name} cache hit ratio", value=stats["hit_ratio"])
+
+        lookups = user_cache.lookups.metrics()
+        calls = CounterMetricFamily("user_lookups", "User loads on a cache miss by outcome", labels=["result"])
+        calls.add_metric(["queried"], lookups["leaders"])
+        calls.add_metric(["coalesced"], lookups["coalesced"])
+        calls.add_metric(["overflow"], lookups["overflows"])
+        calls.add_metric(["timeout"], lookups["timeouts"])
+        yield calls
+        yield GaugeMetricFamily("user_lookups_in_flight", "User loads running right now", value=lookups["in_flight"])
+
+
+state_collector = StateCollector()
+REGISTRY.register(state_collector)
+_multiprocess_registry = None
+
+
+def metrics_response_body():
+    """
+    Under several workers (PROMETHEUS_MULTIPROC_DIR, set up by app.server) the request and stage metrics are
+    merged from every worker's files. The pool and cache state is the answering worker's.
+    """
+    global _multiprocess_registry
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    if _multiprocess_registry is None:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(state_collector)
+        _multiprocess_registry = registry
+    return generate_latest(_multiprocess_registry), CONTENT_TYPE_LATEST
@@ -22,7 +22,6 @@ class User(Base):
 
     email = Column(String, unique=True, index=True)
     is_active = Column(Boolean, default=False)
-    confirmation_token = Column(String, unique=True, nullable=True)
 
     hashed_password = Column(String)
     first_name = Column(String)
@@ -0,0 +1,50 @@
+import hmac
+import json
+from tempfile import SpooledTemporaryFile
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.config import ADMIN_API_KEY
+from app.utlis.bulk_import import iter_lines, iter_rows, import_users
+
+router = APIRouter()
+
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # Request bodies above this go to a temp file
+CHUNK_SIZE = 64 * 1024
+
+
+def verify_admin_key(x_admin_key: str = Header(None)):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin API is disabled.")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key.")
+
+
+@router.post("/users/import", dependencies=[Depends(verify_admin_key)])
+async def import_users_endpoint(request: Request, format: str = "ndjson"):
+    """
+    Takes an NDJSON or CSV body (email, first_name, last_name, password | hashed_password, is_active)
+    and streams back one NDJSON result line per row.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Unsupported format, use 'ndjson' or 'csv'")
+
+    # The body is read in full before responding: once a StreamingResponse starts, Starlette listens for
+    # disconnects on the same receive channel and would swallow the remaining body chunks
+    body = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for chunk in request.stream():
+        body.write(chunk)
+    body.seek(0)
+
+    async def chunks():
+        while chunk := body.read(CHUNK_SIZE):
+            yield chunk
+
+    async def report():
+        try:
+            rows = iter_rows(iter_lines(chunks()), format)
+            async for result in import_users(rows):
+                yield json.dumps(result) + "\n"
+        finally:
+            body.close()
+
+    return StreamingResponse(report(), media_type="application/x-ndjson")
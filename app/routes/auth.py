@@ -1,27 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.utlis.security import decode_access_token, create_access_token, create_refresh_token
-from app.utlis.auth_processing import login
-from app.database import get_db
-from sqlalchemy.orm import Session
-from app.schemas import AuthToken, LoginForm, RefreshTokenRequest
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from app.config import INTROSPECT_API_KEY, INTROSPECT_MAX_TOKENS
+from app.utlis.security import verify_token
+from app.utlis.auth_processing import login, refresh, logout, logout_all
+from app.utlis.rate_limit import check_login_rate_limit
+from app.utlis.introspection import token_introspector
+from app.utlis.serializers import token_response, introspect_response
+from app.database import get_read_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import (AuthToken,
+                         LoginForm,
+                         RefreshTokenRequest,
+                         LogoutRequest,
+                         IntrospectRequest,
+                         IntrospectResponse)
 
 router = APIRouter()
 
 @router.post("/login", response_model=AuthToken)
-async def login_user(login_data: LoginForm, db: Session = Depends(get_db)):
-    return await login(login_data, db)
+async def login_user(login_data: LoginForm, request: Request, db: AsyncSession = Depends(get_read_db)):
+    await check_login_rate_limit(request, login_data.email)
+    return token_response(await login(login_data, db))
 
 @router.post("/refresh", response_model=AuthToken)
-async def refresh_token(refresh_token_request: RefreshTokenRequest):
-    refresh_token = refresh_token_request.refresh_token
-    payload = decode_access_token(refresh_token)
+async def refresh_token(refresh_token_request: RefreshTokenRequest, db: AsyncSession = Depends(get_read_db)):
+    return token_response(await refresh(refresh_token_request.refresh_token, db))
 
-    if not payload or "sub" not in payload:
-        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+@router.post("/logout", response_model=dict)
+async def logout_user(logout_request: LogoutRequest, payload: dict = Depends(verify_token)):
+    """Revokes the current access token and, when given, its refresh token"""
+    await logout(payload, logout_request.refresh_token)
+    return {"message": "Logged out successfully"}
 
-    user_email = payload["sub"]
-    user_uuid = payload["uuid"]
+@router.post("/logout-all", response_model=dict)
+async def logout_all_sessions(payload: dict = Depends(verify_token)):
+    """Revokes every access and refresh token of the user issued so far"""
+    await logout_all(payload)
+    return {"message": "All sessions revoked"}
 
-    new_access_token = create_access_token(user_email=user_email,  user_uuid=user_uuid)
 
-    return {"type": "Success", "access_token": new_access_token, "refresh_token": refresh_token, "token_type": "bearer"}
\ No newline at end of file
+def verify_introspection_key(x_introspection_key: str = Header(None)):
+    if not INTROSPECT_API_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token introspection is disabled.")
+    if not x_introspection_key or not hmac.compare_digest(x_introspection_key, INTROSPECT_API_KEY):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid introspection key.")
+
+@router.post("/introspect", response_model=IntrospectResponse, dependencies=[Depends(verify_introspection_key)])
+async def introspect_tokens(introspect_request: IntrospectRequest):
+    """Validity, claims, expiry and revocation status of a batch of tokens, for gateways that can't verify locally"""
+    if len(introspect_request.tokens) > INTROSPECT_MAX_TOKENS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {INTROSPECT_MAX_TOKENS} tokens per request.")
+    return introspect_response(await token_introspector.introspect(introspect_request.tokens))
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Response, status
+from app import database
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """200 once the DB pool is warm, 503 before, so load balancers only route to warmed up workers"""
+    if not database.pool_warm:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "ready": database.pool_warm,
+        "db_pool": database.pool_status(),
+        # Informational, reads fall back to the primary when no replica is healthy
+        "replicas": database.replica_router.status(),
+    }
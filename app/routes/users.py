@@ -1,50 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.models import User, AuthProviderEnum
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User
 from app.schemas import UserCreate, UserOut, UserOutCreated, UserUpdate, EmailUpdate, PasswordUpdate
 from app.database import get_db
-from app.utlis.security import create_email_confirmation_token, generate_hashed_password, generate_uuid, verify_password
-from app.utlis.users_processing import get_user_by_email, process_user_creation, get_current_user
-from email_tasks.tasks import send_confirmation_email
-from app.config import logger
-import uuid
+from app.utlis.security import (verify_email_confirmation_token,
+                                generate_hashed_password,
+                                verify_password)
+from app.utlis.users_processing import (email_taken,
+                                       process_user_creation,
+                                       get_current_user,
+                                       get_current_principal,
+                                       delete_user_by_uuid,
+                                       CurrentPrincipal)
+from app.utlis.user_cache import user_cache
+from app.utlis.revocation import revocation_store
+from app.utlis.serializers import user_response, user_created_response
+from app.config import SEND_CONFIRMATION_EMAILS
+from app.utlis.email_batcher import email_batcher
 
 
 router = APIRouter()
 
-@router.post("", response_model=UserOutCreated)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = await get_user_by_email(db, user.email)
-    if existing_user:
-        logger.warning(existing_user)
-        raise HTTPException(status_code=400, detail="Email already registered")
 
+async def commit_email_change(db: AsyncSession):
+    """A concurrent sign-up or change can still take the email first, the unique index turns that into a 400"""
     try:
-        db_user, confirmation_token = process_user_creation(db, user)
-    except HTTPException as e:
-        raise e
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+
+@router.post("", response_model=UserOutCreated)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Duplicate emails are detected by the insert itself, see process_user_creation
+    user_uuid, confirmation_token = await process_user_creation(db, user)
 
-    logger.debug(confirmation_token)
-    # send_confirmation_email.delay(user.email, confirmation_token)
+    await user_cache.invalidate(None, user.email)  # Drop a cached "unknown email" entry
 
-    return db_user
+    if SEND_CONFIRMATION_EMAILS:
+        await email_batcher.enqueue(user.email, confirmation_token)
+
+    return user_created_response(user_uuid)
 
 @router.get("", response_model=UserOut)
 async def get_user(
-    current_user: User = Depends(get_current_user)
+    principal: CurrentPrincipal = Depends(get_current_principal)
 ):
-    return current_user
+    return user_response(await principal.get_record())
 
 
 @router.get("/confirm/{token}")
-async def confirm_email(token: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.confirmation_token == token).first()
-    if not user:
+async def confirm_email(token: str, db: AsyncSession = Depends(get_db)):
+    user_uuid = verify_email_confirmation_token(token)
+    if not user_uuid:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    user.is_active = True
-    user.confirmation_token = None
-    db.commit()
+    # Single primary-key update, an already confirmed or deleted user matches no row
+    result = await db.execute(
+        update(User)
+        .where(User.uuid == user_uuid, User.is_active.is_(False))
+        .values(is_active=True)
+        .returning(User.email)
+    )
+    confirmed = result.first()
+    await db.commit()
+    if confirmed is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+
+    await user_cache.invalidate(user_uuid, confirmed.email)
 
     return {"type": "Success", "message": "Email confirmed successfully!"}
 
@@ -52,61 +78,70 @@ async def confirm_email(token: str, db: Session = Depends(get_db)):
 @router.put("/email", response_model=UserOut)
 async def update_email(
         email_update: EmailUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
-    existing_user = db.query(User).filter(User.email == email_update.new_email).first()
-    if existing_user:
+    # Fast rejection only, the unique index on email is what actually guards against duplicates
+    if await email_taken(db, email_update.new_email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
+    old_email = current_user.email
     current_user.email = email_update.new_email
 
     # Optionally require re-confirmation of the new email:
     # current_user.is_active = False
-    # current_user.confirmation_token = create_email_confirmation_token(email_update.new_email)
+    # confirmation_token = create_email_confirmation_token(current_user.uuid)
 
-    db.commit()
-    db.refresh(current_user)
+    await commit_email_change(db)
+    await db.refresh(current_user)
+    await user_cache.invalidate(current_user.uuid, old_email, current_user.email)
 
     # Optionally send a confirmation email:
-    # send_confirmation_email.delay(current_user.email, current_user.confirmation_token)
+    # await email_batcher.enqueue(current_user.email, confirmation_token)
 
-    return current_user
+    return user_response(current_user)
 
 
 @router.put("/password", response_model=dict)
 async def update_password(
         password_update: PasswordUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     # Verify the current password matches the stored hash
-    if not verify_password(password_update.old_password, current_user.hashed_password):
+    if not await verify_password(password_update.old_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
-    current_user.hashed_password = generate_hashed_password(password_update.new_password)
-    db.commit()
+    current_user.hashed_password = await generate_hashed_password(password_update.new_password)
+    await db.commit()
+    await user_cache.invalidate(current_user.uuid, current_user.email)
+    # Sessions opened with the old password end here, this one included
+    await revocation_store.revoke_user(current_user.uuid)
 
     return {"message": "Password updated successfully"}
 
 @router.put("", response_model=UserOut)
 async def update_user(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    old_email = current_user.email
     update_data = user_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(current_user, key, value)
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await commit_email_change(db)
+    await db.refresh(current_user)
+    await user_cache.invalidate(current_user.uuid, old_email, current_user.email)
+    return user_response(current_user)
 
 @router.delete("", response_model=dict)
 async def delete_user(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    principal: CurrentPrincipal = Depends(get_current_principal)
 ):
-    db.delete(current_user)
-    db.commit()
+    # Single DELETE by uuid, the row doesn't need to be loaded first
+    if not await delete_user_by_uuid(db, principal.uuid):
+        raise HTTPException(status_code=401, detail="User not found.")
+    await revocation_store.revoke_user(principal.uuid)
     return {"message": "User deleted successfully"}
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Request, Response
+from app.config import JWKS_MAX_AGE_SECONDS
+from app.utlis.tokens import get_token_service
+
+router = APIRouter()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """RFC 9110 weak comparison against an If-None-Match list: W/ prefixes are ignored, "*" matches anything"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+@router.get("/jwks.json")
+async def jwks(request: Request):
+    body, etag = get_token_service().jwks()
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
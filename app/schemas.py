@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Optional, List
 import uuid
 
 
@@ -11,6 +11,23 @@ class AuthToken(BaseModel):
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str]
+
+class TokenIntrospection(BaseModel):
+    active: bool  # Valid, unexpired and not revoked
+    token_type: Optional[str] = None
+    claims: Optional[dict] = None
+    exp: Optional[int] = None
+    revoked: bool = False
+    error: Optional[str] = None  # "invalid", "expired" or "revoked"
+
+class IntrospectResponse(BaseModel):
+    results: List[TokenIntrospection]
+
 class UserBase(BaseModel):
     email: str
     first_name: str
@@ -0,0 +1,132 @@
+import os
+import shutil
+import argparse
+import tempfile
+import uvicorn
+from app.config import (SERVER,
+                        SERVER_PORT,
+                        SERVER_WORKERS,
+                        SERVER_LOOP,
+                        SERVER_HTTP,
+                        SERVER_BACKLOG,
+                        SERVER_KEEP_ALIVE,
+                        SERVER_LIMIT_CONCURRENCY,
+                        SERVER_ACCESS_LOG,
+                        SERVER_PROXY_HEADERS,
+                        REVOCATION_BACKEND,
+                        RATE_LIMIT_BACKEND,
+                        USER_CACHE_BACKEND,
+                        USER_CACHE_TTL,
+                        logger)
+from app.utlis.hashing import calibrate_bcrypt_rounds
+
+"""
+# Production launcher
+# python -m app.server: one uvicorn worker process per CPU sharing the listening socket. Every worker imports
+# the app on its own, so DB pool, caches and the hashing pool are per worker and set up by its startup hook.
+# On SIGTERM/SIGINT the workers stop accepting, finish in-flight requests, then run the shutdown hooks.
+"""
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # Honours CPU pinning, unlike os.cpu_count()
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def local_backends() -> list:
+    """Backends that keep their state in the worker process, wrong as soon as a second worker shares the socket"""
+    return [name for name, backend in (("REVOCATION_BACKEND", REVOCATION_BACKEND),
+                                       ("RATE_LIMIT_BACKEND", RATE_LIMIT_BACKEND)) if backend == "memory"]
+
+
+def resolve_workers(requested: int, cpus: int) -> int:
+    """0 picks one worker per CPU, or a single one while the revocation or rate limit state is per process"""
+    if requested:
+        return requested
+    local = local_backends()
+    if local and cpus > 1:
+        logger.warning("%s=memory: starting 1 worker instead of %d, set them to redis to use every CPU",
+                       " and ".join(local), cpus)
+        return 1
+    return cpus
+
+
+def check_shared_state(workers: int):
+    """Per-process backends behind one socket: each request only sees the state of the worker it landed on"""
+    if workers == 1:
+        return
+    local = local_backends()
+    if local:
+        raise SystemExit(f"{' and '.join(local)}=memory can't be shared by {workers} workers: logouts and revoked "
+                         f"sessions would only count on one worker and rate limits multiply by the worker count. "
+                         f"Use redis, or --workers 1.")
+    if USER_CACHE_BACKEND == "memory":
+        logger.warning("USER_CACHE_BACKEND=memory with %d workers: profile changes reach the other workers' caches "
+                       "only after USER_CACHE_TTL (%ds)", workers, USER_CACHE_TTL)
+
+
+def prepare_metrics_dir(workers: int):
+    """
+    Points the workers' prometheus_client at one directory so /metrics covers all of them, whichever answers.
+    Returns the directory when it's a temporary one to remove on exit.
+    """
+    if workers == 1:
+        return None
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith(".db"):
+                os.remove(os.path.join(path, name))  # Left over from the previous run
+        return None
+    path = tempfile.mkdtemp(prefix="auth-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.server")
+    parser.add_argument("--host", default=SERVER)
+    parser.add_argument("--port", type=int, default=int(SERVER_PORT))
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="0 = one per available CPU, 1 with memory revocation or rate limit backends")
+    args = parser.parse_args(argv)
+
+    cpus = available_cpus()
+    workers = resolve_workers(args.workers, cpus)
+    check_shared_state(workers)
+    if workers > 1 and "HASH_WORKERS" not in os.environ:
+        # Workers read the config again, split the cores between their hashing pools instead of each taking all
+        os.environ["HASH_WORKERS"] = str(max(cpus // workers, 1))
+    if not os.environ.get("HASH_ROUNDS"):
+        # Calibrate once here, workers calibrating side by side would skew each other and could disagree by a
+        # round, making each flag the others' hashes for a rehash
+        os.environ["HASH_ROUNDS"] = str(calibrate_bcrypt_rounds())
+
+    metrics_dir = prepare_metrics_dir(workers)
+
+    logger.info("Starting %d workers on %s:%d", workers, args.host, args.port)
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            loop=SERVER_LOOP,
+            http=SERVER_HTTP,
+            backlog=SERVER_BACKLOG,
+            timeout_keep_alive=SERVER_KEEP_ALIVE,
+            limit_concurrency=SERVER_LIMIT_CONCURRENCY or None,
+            access_log=SERVER_ACCESS_LOG,  # Off by default, request metrics and ids already cover it
+            proxy_headers=SERVER_PROXY_HEADERS,
+            lifespan="on",
+        )
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
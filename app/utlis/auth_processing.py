@@ -1,6 +1,20 @@
+import jwt
+import asyncio
 from fastapi import HTTPException
-from app.models import User
-from app.utlis.security import verify_password, create_access_token, create_refresh_token
+from app.config import logger
+from app.utlis.security import (verify_password,
+                                password_needs_update,
+                                create_access_token,
+                                create_refresh_token,
+                                token_type)
+from app.utlis.tokens import get_token_service
+from app.utlis.revocation import revocation_store
+from app.metrics import timed_stage
+from app.utlis.users_processing import get_user_credentials, get_user_record_by_uuid, rehash_password
+from app.utlis.serializers import token_pair
+
+# Strong references to fire-and-forget tasks, the event loop only keeps weak ones
+_background_tasks = set()
 
 
 
@@ -27,22 +41,86 @@ async def email_login(form_data, db):
     email = form_data.email
     password = form_data.password
 
-    # Fetch user by email
-    user = db.query(User).filter(User.email == email).first()
+    # Fetch user by email from a replica (the primary right after a write), the hash is never served from the cache
+    user = await get_user_credentials(db, email)
 
-    if not user or not verify_password(password, user.hashed_password):
+    # Unknown users still pay for a (dummy) hash, so timing doesn't tell which emails are registered
+    password_ok = await verify_password(password, user.hashed_password if user else None)
+    if not user or not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if password_needs_update(user.hashed_password):
+        # Upgrade to the current cost while we have the plain password, without delaying this response
+        task = asyncio.create_task(rehash_password(user.uuid, user.email, password, user.hashed_password))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
     # Generate access and refresh tokens
-    access_token = create_access_token(user_email=user.email, user_uuid=user.uuid)
-    refresh_token = create_refresh_token(user_email=user.email, user_uuid=user.uuid)
+    claims = _claims(user)
+    access_token = create_access_token(**claims)
+    refresh_token = create_refresh_token(**claims)
 
     # Return the tokens and token type
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer"
-    }
+    return token_pair(access_token, refresh_token)
+
+
+"""
+# Refresh
+"""
+
+def _claims(user) -> dict:
+    provider = user.auth_provider.value if user.auth_provider else "email"
+    return {"user_email": user.email, "user_uuid": user.uuid, "is_active": bool(user.is_active), "provider": provider}
+
+
+async def refresh(refresh_token: str, db):
+    """
+    Rotates a refresh token: the presented one is revoked and a new access/refresh pair is issued.
+    A refresh token that was already used means a copy is in someone else's hands, every session of
+    the user is revoked then. The new pair carries the user's current claims, a deleted user can't refresh.
+    """
+    try:
+        with timed_stage("jwt_verify"):
+            payload = get_token_service().verify(refresh_token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+    if token_type(payload) != "refresh" or "uuid" not in payload or "jti" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+    if await revocation_store.is_cut_off(payload):
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+    user = await get_user_record_by_uuid(db, payload["uuid"])
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+
+    if not await revocation_store.revoke(payload):
+        logger.warning("Refresh token reuse detected for user %s, revoking all sessions", payload["uuid"])
+        await revocation_store.revoke_user(payload["uuid"])
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+    claims = _claims(user)
+    return token_pair(create_access_token(**claims), create_refresh_token(**claims))
+
+
+"""
+# Logout
+"""
+
+async def logout(access_payload: dict, refresh_token: str = None):
+    await revocation_store.revoke(access_payload)
+    if refresh_token:
+        try:
+            refresh_payload = get_token_service().verify(refresh_token)
+        except jwt.InvalidTokenError:
+            return  # Expired or invalid, nothing left to revoke
+        if refresh_payload.get("uuid") == access_payload.get("uuid"):
+            await revocation_store.revoke(refresh_payload)
+
+
+async def logout_all(access_payload: dict):
+    await revocation_store.revoke_user(access_payload["uuid"])
 
 
 async def google_login(form_data, db):
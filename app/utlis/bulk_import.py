@@ -0,0 +1,197 @@
+import re
+import csv
+import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+from app.models import User, AuthProviderEnum
+from app.config import BULK_IMPORT_CHUNK_SIZE, BULK_IMPORT_WORKERS, logger
+from app.database import get_sessionmaker
+from app.utlis.hashing import _hash, pwd_context, process_pool_settings
+from app.utlis.security import generate_uuid
+from app.utlis.user_cache import user_cache
+
+"""
+# Bulk user import
+# Rows are streamed in, hashed in parallel across cores and written in chunks with multi-row
+# INSERT ... ON CONFLICT (email) DO NOTHING, so memory only ever holds one chunk.
+# COPY is not used since it can't skip duplicate emails or tell which rows were skipped.
+"""
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BULK_IMPORT_WORKERS, **process_pool_settings())
+    return _pool
+
+
+"""
+# Parsing
+"""
+
+async def iter_lines(chunks):
+    """Splits an async stream of bytes into text lines without buffering more than one line"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+async def iter_rows(lines, file_format: str = "ndjson"):
+    """Yields (line_number, row dict or parse error string)"""
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            if file_format == "csv":
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                row = dict(zip(header, values))
+            else:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("Expected a JSON object")
+        except (ValueError, csv.Error, StopIteration) as e:
+            yield line_number, f"Unparsable row: {e}"
+            continue
+        yield line_number, row
+
+
+# $2b$<cost>$ followed by the 22 character salt and 31 character digest
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$(0[4-9]|[12][0-9]|3[01])\$[./A-Za-z0-9]{53}$")
+
+
+def validate_row(row: dict):
+    """Returns an error message or None"""
+    if not row.get("email"):
+        return "Missing email"
+    if bool(row.get("password")) == bool(row.get("hashed_password")):
+        return "Exactly one of password or hashed_password is required"
+    hashed_password = row.get("hashed_password")
+    if hashed_password and not (isinstance(hashed_password, str) and BCRYPT_HASH.match(hashed_password)
+                                and pwd_context.identify(hashed_password) == "bcrypt"):
+        # Stored as given, anything else would only fail (with a 500) on the user's first login
+        return "hashed_password is not a bcrypt hash"
+    return None
+
+
+def _is_active(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+"""
+# Import
+"""
+
+async def _done(value):
+    return value
+
+
+async def _import_chunk(db, chunk):
+    """chunk: list of (line_number, row). Returns the per-row results in input order"""
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    results = {}
+    pending = []
+    seen = set()
+
+    for line_number, row in chunk:
+        email = row["email"]
+        if email in seen:
+            results[line_number] = {"line": line_number, "email": email, "status": "duplicate"}
+            continue
+        seen.add(email)
+        pending.append((line_number, row))
+
+    hashes = await asyncio.gather(*[
+        loop.run_in_executor(pool, _hash, row["password"]) if row.get("password") else _done(row["hashed_password"])
+        for _, row in pending
+    ])
+
+    values = []
+    for (line_number, row), hashed_password in zip(pending, hashes):
+        values.append(dict(
+            uuid=generate_uuid(),
+            email=row["email"],
+            hashed_password=hashed_password,
+            first_name=row.get("first_name"),
+            last_name=row.get("last_name"),
+            auth_provider=AuthProviderEnum.EMAIL,
+            is_active=_is_active(row.get("is_active", False))
+        ))
+
+    created = {}
+    if values:
+        statement = (
+            insert(User)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User.email, User.uuid)
+        )
+        created = {email: user_uuid for email, user_uuid in (await db.execute(statement)).all()}
+        await db.commit()
+        if created:
+            await user_cache.invalidate(None, *created)
+
+    for line_number, row in pending:
+        email = row["email"]
+        if email in created:
+            results[line_number] = {"line": line_number, "email": email, "status": "created",
+                                    "uuid": str(created[email])}
+        else:
+            results[line_number] = {"line": line_number, "email": email, "status": "duplicate"}
+
+    return [results[line_number] for line_number, _ in chunk]
+
+
+async def _flush(db, chunk):
+    try:
+        return await _import_chunk(db, chunk)
+    except SQLAlchemyError as e:
+        # One bad row fails the whole multi-row insert, report it on every row of the chunk and carry on
+        await db.rollback()
+        logger.error("Bulk import chunk failed: %s", e)
+        return [{"line": line_number, "email": row["email"], "status": "error", "error": "Chunk insert failed"}
+                for line_number, row in chunk]
+
+
+async def import_users(rows, chunk_size: int = BULK_IMPORT_CHUNK_SIZE):
+    """
+    Consumes an async iterator of (line_number, row) from iter_rows and yields one result dict per row:
+    {"line", "email", "status": "created" | "duplicate" | "error", "uuid" | "error"}
+    """
+    async with get_sessionmaker()() as db:
+        chunk = []
+        async for line_number, row in rows:
+            if isinstance(row, str):
+                yield {"line": line_number, "status": "error", "error": row}
+                continue
+            error = validate_row(row)
+            if error:
+                yield {"line": line_number, "email": row.get("email"), "status": "error", "error": error}
+                continue
+
+            chunk.append((line_number, row))
+            if len(chunk) >= chunk_size:
+                for result in await _flush(db, chunk):
+                    yield result
+                chunk = []
+
+        if chunk:
+            for result in await _flush(db, chunk):
+                yield result
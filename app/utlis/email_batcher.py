@@ -0,0 +1,68 @@
+import time
+import asyncio
+from app.config import EMAIL_BATCH_SIZE, EMAIL_BATCH_WINDOW_MS, logger
+from app.metrics import timed_stage
+
+
+class EmailBatcher:
+    """
+    Collects confirmation emails in the API process and hands them to Celery as one
+    send_confirmation_emails task per batch, either every `window_ms` or once `batch_size` are pending.
+    """
+
+    def __init__(self, batch_size: int = 50, window_ms: int = 200):
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+        self.enqueued = 0
+        self.batches = 0
+        self.dispatch_errors = 0
+
+    async def enqueue(self, to_email: str, token: str):
+        self._pending.append({"to": to_email, "token": token, "enqueued_at": time.time(), "attempt": 0})
+        self.enqueued += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        from email_tasks.tasks import send_confirmation_emails
+        try:
+            # .delay() talks to the broker synchronously, keep it off the event loop
+            with timed_stage("celery_enqueue"):
+                await asyncio.to_thread(send_confirmation_emails.delay, batch)
+            self.batches += 1
+        except Exception as e:
+            self.dispatch_errors += 1
+            logger.error("Failed to enqueue %d confirmation emails: %s", len(batch), e)
+
+    async def close(self):
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "batches": self.batches,
+            "dispatch_errors": self.dispatch_errors,
+        }
+
+
+email_batcher = EmailBatcher(batch_size=EMAIL_BATCH_SIZE, window_ms=EMAIL_BATCH_WINDOW_MS)
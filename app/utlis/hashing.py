@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.config import (HASH_EXECUTOR,
+                        HASH_WORKERS,
+                        HASH_QUEUE_LIMIT,
+                        HASH_RETRY_AFTER_SECONDS,
+                        HASH_TARGET_MS,
+                        HASH_ROUNDS,
+                        HASH_MIN_ROUNDS,
+                        HASH_MAX_ROUNDS,
+                        logger)
+
+# Password hashing context, the bcrypt cost is set by setup_password_hashing()
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bcrypt_rounds = None
+BCRYPT_MAX_ROUNDS = 31  # Highest cost the bcrypt format allows
+
+
+"""
+# Worker functions
+# Module level so they can be pickled into a process pool
+"""
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def configure_rounds(rounds: int):
+    """
+    Hashes with `rounds` from now on. It's the minimum too, so needs_update() flags older, cheaper hashes
+    for a rehash on the next login. The maximum is bcrypt's own ceiling: without it passlib also flags more
+    expensive hashes, and hosts calibrated differently would keep rewriting each other's hashes.
+    Also the initializer of process pools, which don't share this module's state.
+    """
+    global bcrypt_rounds
+    pwd_context.update(bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=BCRYPT_MAX_ROUNDS)
+    bcrypt_rounds = rounds
+
+
+"""
+# Cost calibration
+"""
+
+def calibrate_bcrypt_rounds(target_ms: int = HASH_TARGET_MS, min_rounds: int = HASH_MIN_ROUNDS,
+                            max_rounds: int = HASH_MAX_ROUNDS, samples: int = 3) -> int:
+    """Most rounds whose hash still fits in target_ms on this host, each extra round doubles the cost"""
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=min_rounds)
+    elapsed = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_ms / 1000:
+        elapsed *= 2
+        rounds += 1
+    return rounds
+
+
+def setup_password_hashing() -> int:
+    """HASH_ROUNDS when set, otherwise calibrated to HASH_TARGET_MS. Runs once per process before any hash"""
+    if HASH_ROUNDS:
+        rounds = HASH_ROUNDS
+    else:
+        start = time.perf_counter()
+        rounds = calibrate_bcrypt_rounds()
+        logger.info("bcrypt cost calibrated to %d rounds for a %dms target in %.2fs",
+                    rounds, HASH_TARGET_MS, time.perf_counter() - start)
+    configure_rounds(rounds)
+    backend = pwd_context.handler("bcrypt").get_backend()
+    if backend != "bcrypt":
+        # e.g. os_crypt, which holds the GIL: a thread pool then hashes one password at a time
+        logger.warning("passlib is using the %s bcrypt backend, install the bcrypt package", backend)
+    hashing_executor.reset()
+    return rounds
+
+
+def process_pool_settings() -> dict:
+    """ProcessPoolExecutor arguments that carry the configured cost into the workers"""
+    if bcrypt_rounds is None:
+        return {}
+    return {"initializer": configure_rounds, "initargs": (bcrypt_rounds,)}
+
+
+"""
+# Executor
+"""
+
+class HashingExecutor:
+    """
+    Runs bcrypt off the event loop on a bounded pool.
+    At most `workers` hashes run at once and `queue_limit` more may wait, anything beyond that is
+    rejected straight away with a 503 so a login storm can't pile up unbounded work.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = None, queue_limit: int = 64,
+                 retry_after: int = 1):
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self.retry_after = retry_after
+        self._pool = None
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.kind == "process":
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers, **process_pool_settings())
+                    else:
+                        # The bcrypt backend releases the GIL while hashing, threads are enough
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._pool
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry later.",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), func, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight -= 1
+            self.completed += 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(_verify, plain_password, hashed_password)
+
+    async def dummy_verify(self, plain_password: str) -> bool:
+        """Same cost as a real verify, for unknown users so response time doesn't reveal which emails exist"""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.run(_hash, "dummy-password-for-timing")
+        await self.run(_verify, plain_password, self._dummy_hash)
+        return False
+
+    def reset(self):
+        """After the hashing cost changed: new process pool workers and a new dummy hash"""
+        self.shutdown()
+        self._dummy_hash = None
+
+    def metrics(self) -> dict:
+        return {
+            "bcrypt_rounds": bcrypt_rounds,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_avg_seconds": self.latency_total / self.completed if self.completed else 0.0,
+            "latency_max_seconds": self.latency_max,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+hashing_executor = HashingExecutor(
+    kind=HASH_EXECUTOR,
+    workers=HASH_WORKERS,
+    queue_limit=HASH_QUEUE_LIMIT,
+    retry_after=HASH_RETRY_AFTER_SECONDS
+)
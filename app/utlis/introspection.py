@@ -0,0 +1,101 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import jwt
+from app.config import INTROSPECT_EXECUTOR, INTROSPECT_WORKERS, INTROSPECT_PARALLEL_MIN
+from app.utlis.tokens import get_token_service
+from app.utlis.token_cache import token_cache
+from app.utlis.revocation import revocation_store
+from app.utlis.security import token_type
+from app.utlis.serializers import introspection_result
+
+"""
+# Batch token introspection
+# Cached tokens are answered straight away, the rest are verified in chunks on a pool once there are enough
+# of them to be worth the hand-off. Verified payloads go into the same cache verify_token reads.
+"""
+
+
+def _verify_chunk(tokens):
+    """Module level so it can be pickled into a process pool. Returns (payload, error) per token"""
+    service = get_token_service()
+    results = []
+    for token in tokens:
+        try:
+            results.append((service.verify(token), None))
+        except jwt.ExpiredSignatureError:
+            results.append((None, "expired"))
+        except jwt.InvalidTokenError:
+            results.append((None, "invalid"))
+    return results
+
+
+class TokenIntrospector:
+    def __init__(self, kind: str = "thread", workers: int = 4, parallel_min: int = 8):
+        self.kind = kind
+        self.workers = max(workers, 1)
+        self.parallel_min = parallel_min
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="introspect")
+        return self._pool
+
+    async def _verify(self, tokens):
+        if len(tokens) < self.parallel_min or self.workers == 1:
+            return _verify_chunk(tokens)
+        size = -(-len(tokens) // self.workers)  # Ceiling, one chunk per worker
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(self._get_pool(), _verify_chunk, tokens[i:i + size])
+            for i in range(0, len(tokens), size)
+        ))
+        return [result for chunk in chunks for result in chunk]
+
+    async def introspect(self, tokens) -> list:
+        """One result per token, in order. Duplicates in the batch are verified once"""
+        payloads, errors = {}, {}
+        misses = []
+        for token in dict.fromkeys(tokens):
+            payload = token_cache.get(token)
+            if payload is None:
+                misses.append(token)
+            else:
+                payloads[token] = payload
+
+        for token, (payload, error) in zip(misses, await self._verify(misses)):
+            if payload is None:
+                errors[token] = error
+            else:
+                payloads[token] = payload
+                token_cache.set(token, payload)
+
+        valid = list(payloads)
+        revoked = dict(zip(valid, await asyncio.gather(*(revocation_store.is_revoked(payloads[token])
+                                                         for token in valid))))
+
+        results = []
+        for token in tokens:
+            payload = payloads.get(token)
+            if payload is None:
+                results.append(introspection_result(False, error=errors[token]))
+            else:
+                results.append(introspection_result(not revoked[token], token_type(payload), payload,
+                                                    payload.get("exp"), revoked[token],
+                                                    "revoked" if revoked[token] else None))
+        return results
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+token_introspector = TokenIntrospector(
+    kind=INTROSPECT_EXECUTOR,
+    workers=INTROSPECT_WORKERS,
+    parallel_min=INTROSPECT_PARALLEL_MIN
+)
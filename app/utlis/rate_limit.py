@@ -0,0 +1,129 @@
+import time
+import math
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from app.config import (RATE_LIMIT_BACKEND,
+                        RATE_LIMIT_REDIS_URL,
+                        RATE_LIMIT_TRUST_FORWARDED,
+                        RATE_LIMIT_TRUSTED_PROXY_HOPS,
+                        LOGIN_RATE_LIMIT_PER_IP,
+                        LOGIN_RATE_LIMIT_PER_EMAIL,
+                        LOGIN_RATE_LIMIT_GLOBAL,
+                        logger)
+from app.logs import SAMPLED
+
+"""
+# Rate limiting
+# Sliding window counter: the current fixed window's count plus the previous window's count weighted by
+# how much of it still overlaps the sliding window. Two integers per key, no per-request timestamps.
+"""
+
+
+def parse_limit(value: str):
+    """'10/60' -> (10, 60): 10 requests per 60 seconds. Empty or '0' disables the limit"""
+    if not value or value.strip() in ("0", "off"):
+        return None
+    count, _, period = value.partition("/")
+    return int(count), int(period or 60)
+
+
+class MemoryRateLimitBackend:
+    """
+    LRU bounded: a flood of distinct keys only pushes out the least recently hit ones, the keys that keep
+    being hit (the flooding IP, the global budget) stay at the end and keep their counts.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # key -> (window index, count, previous count)
+
+    async def hit(self, key: str, period: int, now: float):
+        window = int(now // period)
+        current_window, count, previous = self._windows.get(key, (window, 0, 0))
+        if current_window != window:
+            previous = count if current_window == window - 1 else 0
+            count = 0
+        count += 1
+        self._windows[key] = (window, count, previous)
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+        return count, previous
+
+
+class RedisRateLimitBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+
+    async def hit(self, key: str, period: int, now: float):
+        window = int(now // period)
+        current_key = f"ratelimit:{key}:{window}"
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, period * 2)
+            pipe.get(f"ratelimit:{key}:{window - 1}")
+            count, _, previous = await pipe.execute()
+        return int(count), int(previous or 0)
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(self, key: str, limit: int, period: int):
+        """Counts one request, returns seconds to wait when over the limit, otherwise 0"""
+        now = time.time()
+        count, previous = await self.backend.hit(key, period, now)
+        elapsed = (now % period) / period
+        estimated = previous * (1 - elapsed) + count
+        if estimated <= limit:
+            return 0
+        return max(math.ceil(period - (now % period)), 1)
+
+
+def create_backend(kind: str):
+    if kind == "redis":
+        return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryRateLimitBackend()
+
+
+rate_limiter = RateLimiter(create_backend(RATE_LIMIT_BACKEND))
+
+# Narrowest first, so attempts already rejected per IP or email don't eat into the global budget
+LOGIN_LIMITS = (
+    ("ip", parse_limit(LOGIN_RATE_LIMIT_PER_IP)),
+    ("email", parse_limit(LOGIN_RATE_LIMIT_PER_EMAIL)),
+    ("global", parse_limit(LOGIN_RATE_LIMIT_GLOBAL)),
+)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # Each trusted proxy appends the address it saw, anything left of those is up to the client.
+            # The entry RATE_LIMIT_TRUSTED_PROXY_HOPS from the right was written by the outermost one
+            addresses = [address.strip() for address in forwarded.split(",")]
+            return addresses[-min(max(RATE_LIMIT_TRUSTED_PROXY_HOPS, 1), len(addresses))]
+    return request.client.host if request.client else "unknown"
+
+
+async def check_login_rate_limit(request: Request, email: str):
+    """Runs before any DB query or hash, raises 429 once a global, per-IP or per-email budget is spent"""
+    keys = {"global": "login:global", "ip": f"login:ip:{client_ip(request)}", "email": f"login:email:{email.lower()}"}
+    for scope, limit in LOGIN_LIMITS:
+        if limit is None:
+            continue
+        try:
+            retry_after = await rate_limiter.hit(keys[scope], *limit)
+        except Exception as e:
+            # Fail open, an unavailable limiter store must not lock everyone out
+            logger.error("Rate limiter unavailable: %s", e, extra=SAMPLED)
+            return
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, please retry later.",
+                headers={"Retry-After": str(retry_after)}
+            )
@@ -0,0 +1,146 @@
+import time
+import heapq
+import uuid
+from app.config import REVOCATION_BACKEND, REVOCATION_REDIS_URL, REFRESH_TOKEN_EXPIRE_DAYS, logger
+from app.logs import SAMPLED
+
+"""
+# Token revocation
+# Two O(1) checks per token:
+#   - its jti is in a TTL-bounded set (logout, rotated refresh tokens), each entry dies with the token's exp
+#   - its iat_ms is not older than the user's "revoked before" cutoff (revoke all sessions: one key per user,
+#     no matter how many tokens are outstanding)
+"""
+
+# Every token of a user is expired this long after a cutoff, so cutoffs don't need to live longer
+CUTOFF_TTL = REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+# Cutoffs below this were stored in seconds, before tokens carried iat_ms
+SECOND_CUTOFFS = 10 ** 11
+
+
+def _jti_key(jti: str) -> bytes:
+    # 16 raw bytes instead of a 36 char string per revoked token
+    try:
+        return uuid.UUID(jti).bytes
+    except (ValueError, TypeError, AttributeError):
+        return str(jti).encode()
+
+
+class MemoryRevocationBackend:
+    """Per-process store. Revocations aren't shared between workers, use redis when running several"""
+
+    def __init__(self):
+        self._jtis = {}
+        self._expiry = []  # Min-heap of (exp, key) for pruning
+        self._cutoffs = {}
+
+    def _prune(self):
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = heapq.heappop(self._expiry)
+            if self._jtis.get(key, now + 1) <= now:
+                del self._jtis[key]
+
+    async def add_jti(self, jti: str, exp: float) -> bool:
+        self._prune()
+        key = _jti_key(jti)
+        if key in self._jtis:
+            return False
+        self._jtis[key] = exp
+        heapq.heappush(self._expiry, (exp, key))
+        return True
+
+    async def has_jti(self, jti: str) -> bool:
+        exp = self._jtis.get(_jti_key(jti))
+        return exp is not None and exp > time.time()
+
+    async def set_cutoff(self, user_uuid: str, cutoff: int):
+        self._cutoffs[str(user_uuid)] = (cutoff, time.time() + CUTOFF_TTL)
+
+    async def get_cutoff(self, user_uuid: str):
+        entry = self._cutoffs.get(str(user_uuid))
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._cutoffs[str(user_uuid)]
+            return None
+        return entry[0]
+
+
+class RedisRevocationBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+
+    async def add_jti(self, jti: str, exp: float) -> bool:
+        ttl = max(int(exp - time.time()) + 1, 1)
+        # NX makes revoke-and-check a single atomic step, two concurrent refreshes can't both win
+        return bool(await self._redis.set(b"revoked:jti:" + _jti_key(jti), b"1", ex=ttl, nx=True))
+
+    async def has_jti(self, jti: str) -> bool:
+        return bool(await self._redis.exists(b"revoked:jti:" + _jti_key(jti)))
+
+    async def set_cutoff(self, user_uuid: str, cutoff: int):
+        await self._redis.set(f"revoked:user:{user_uuid}", cutoff, ex=CUTOFF_TTL)
+
+    async def get_cutoff(self, user_uuid: str):
+        value = await self._redis.get(f"revoked:user:{user_uuid}")
+        return int(value) if value is not None else None
+
+
+class RevocationStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def revoke(self, payload: dict) -> bool:
+        """Revokes a token by its jti until it expires. False if it already was revoked"""
+        jti = payload.get("jti")
+        if not jti:
+            return True
+        return await self.backend.add_jti(jti, payload.get("exp") or time.time() + CUTOFF_TTL)
+
+    async def revoke_user(self, user_uuid: str):
+        """
+        Revokes every token of the user issued before this call, to the millisecond: tokens minted earlier in the
+        same second are revoked too, the ones minted after it (a fresh login) stay valid.
+        """
+        await self.backend.set_cutoff(user_uuid, int(time.time() * 1000))
+
+    async def is_revoked(self, payload: dict) -> bool:
+        try:
+            jti = payload.get("jti")
+            if jti and await self.backend.has_jti(jti):
+                return True
+            return await self._is_cut_off(payload)
+        except Exception as e:
+            # Fail closed, a revoked session must not slip through while the store is down
+            logger.error("Revocation check failed: %s", e, extra=SAMPLED)
+            return True
+
+    async def is_cut_off(self, payload: dict) -> bool:
+        """Only the per-user "revoke all sessions" check"""
+        try:
+            return await self._is_cut_off(payload)
+        except Exception as e:
+            logger.error("Revocation check failed: %s", e, extra=SAMPLED)
+            return True
+
+    async def _is_cut_off(self, payload: dict) -> bool:
+        cutoff = await self.backend.get_cutoff(payload.get("uuid"))
+        if cutoff is None:
+            return False
+        if cutoff < SECOND_CUTOFFS:
+            cutoff *= 1000
+        issued = payload.get("iat_ms")
+        if not isinstance(issued, int):
+            issued = payload.get("iat", 0) * 1000  # Issued before iat_ms existed
+        return issued < cutoff
+
+
+def create_backend(kind: str):
+    if kind == "redis":
+        return RedisRevocationBackend(REVOCATION_REDIS_URL)
+    return MemoryRevocationBackend()
+
+
+revocation_store = RevocationStore(create_backend(REVOCATION_BACKEND))
@@ -1,65 +1,124 @@
 import uuid
 import jwt
+import hmac
+import time
+import base64
+import struct
+import hashlib
 import datetime
 from fastapi import Header, HTTPException, status
-from passlib.context import CryptContext
-from app.config import (PRIVATE_KEY,
-                        PUBLIC_KEY,
-                        JWT_ALGORITHM,
-                        ACCESS_TOKEN_EXPIRE_MINUTES,
+from app.config import (ACCESS_TOKEN_EXPIRE_MINUTES,
                         REFRESH_TOKEN_EXPIRE_DAYS,
+                        EMAIL_CONFIRMATION_SECRET,
+                        EMAIL_CONFIRMATION_EXPIRE_HOURS,
                         logger)
+from app.utlis.hashing import hashing_executor, pwd_context
+from app.utlis.tokens import get_token_service
+from app.utlis.token_cache import token_cache
+from app.utlis.revocation import revocation_store
+from app.metrics import timed_stage
+from app.logs import SAMPLED
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def create_access_token(user_email: str, user_uuid: str):
-    expire = datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+def _sign(payload: dict) -> str:
+    with timed_stage("token_sign"):
+        return get_token_service().sign(payload)
+
+
+def create_access_token(user_email: str, user_uuid: str, is_active: bool = False, provider: str = "email"):
+    issued = time.time()
+    now = datetime.datetime.utcfromtimestamp(issued)
+    expire = now + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     data = {
+        "typ": "access",
         "uuid": str(user_uuid),
+        "email": user_email,
+        "is_active": bool(is_active),  # Authorization claims, read by CurrentPrincipal without a DB lookup
+        "provider": provider,
+        "iat": now,
+        "iat_ms": int(issued * 1000),  # iat has whole seconds, revocation cutoffs compare against this one
         "exp": expire,
         "jti": str(uuid.uuid4()),  # Unique identifier for the token
     }
-    return jwt.encode(data, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
+    return _sign(data)
 
 
-def create_refresh_token(user_email: str, user_uuid: str):
-    expire = datetime.datetime.utcnow() + datetime.timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+def create_refresh_token(user_email: str, user_uuid: str, is_active: bool = False, provider: str = "email"):
+    issued = time.time()
+    now = datetime.datetime.utcfromtimestamp(issued)
+    expire = now + datetime.timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     refresh_data = {
+        "typ": "refresh",
         "uuid": str(user_uuid),
+        "is_active": bool(is_active),  # Carried over into the access tokens minted on refresh
+        "provider": provider,
+        "iat": now,
+        "iat_ms": int(issued * 1000),  # iat has whole seconds, revocation cutoffs compare against this one
         "exp": expire,
-        "jti": str(uuid.uuid4()),  # Unique identifier for the refresh token
+        "jti": str(uuid.uuid4()),  # Unique identifier for the refresh token, rotated and revoked on every refresh
         "sub": user_email  # Add the user email (or user ID) here as the subject
     }
-    return jwt.encode(refresh_data, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
+    return _sign(refresh_data)
 
 def create_email_confirmation_token(user_uuid: str) -> str:
-    expire = datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    payload = {
-        "uuid": str(user_uuid),
-        "sub": str(user_uuid),
-        "exp": expire
-    }
-    return jwt.encode(payload, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
+    """
+    Short, self-verifying token: base64url(uuid[16] | expires_at[4] | hmac-sha256[:16]), 48 chars.
+    Nothing is stored, confirm_email checks the MAC and expiry and updates the row by uuid.
+    """
+    expires_at = int(time.time()) + EMAIL_CONFIRMATION_EXPIRE_HOURS * 3600
+    message = uuid.UUID(str(user_uuid)).bytes + struct.pack(">I", expires_at)
+    mac = hmac.new(EMAIL_CONFIRMATION_SECRET, message, hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(message + mac).decode().rstrip("=")
+
+def verify_email_confirmation_token(token: str):
+    """Returns the user uuid, or None for a malformed, forged or expired token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) != 36:
+        return None
+
+    message, mac = raw[:20], raw[20:]
+    expected = hmac.new(EMAIL_CONFIRMATION_SECRET, message, hashlib.sha256).digest()[:16]
+    if not hmac.compare_digest(mac, expected):
+        return None
+
+    (expires_at,) = struct.unpack(">I", message[16:])
+    if expires_at < time.time():
+        return None
+    return uuid.UUID(bytes=message[:16])
+
+def token_type(payload: dict) -> str:
+    # Tokens issued before "typ" existed: only refresh tokens had a "sub"
+    return payload.get("typ") or ("refresh" if "sub" in payload else "access")
 
 def decode_access_token(token: str):
     try:
-        return jwt.decode(token, PUBLIC_KEY, algorithms=[JWT_ALGORITHM])
+        return get_token_service().verify(token)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
-def generate_hashed_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def generate_hashed_password(password: str) -> str:
+    with timed_stage("bcrypt_hash"):
+        return await hashing_executor.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    with timed_stage("bcrypt_verify"):
+        if not hashed_password:
+            return await hashing_executor.dummy_verify(plain_password)
+        return await hashing_executor.verify(plain_password, hashed_password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def password_needs_update(hashed_password: str) -> bool:
+    """True for hashes below the configured cost, only parses the hash string"""
+    return bool(hashed_password) and pwd_context.needs_update(hashed_password)
 
 def generate_uuid() -> str:
     return str(uuid.uuid4())
 
-def verify_token(authorization: str = Header(None)):  # Accept None to avoid error when missing
+async def verify_token(authorization: str = Header(None)):  # Accept None to avoid error when missing
     if authorization is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -79,18 +138,35 @@ def verify_token(authorization: str = Header(None)):  # Accept None to avoid err
             detail="Invalid authorization header format. Expected 'Bearer <token>'."
         )
 
-    try:
-        payload = jwt.decode(token, PUBLIC_KEY, algorithms=["RS256"])
-    except jwt.ExpiredSignatureError:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            with timed_stage("jwt_verify"):
+                payload = get_token_service().verify(token)
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired."
+            )
+        except jwt.InvalidTokenError as e:
+            logger.error("JWT verification error: %s", e, extra=SAMPLED)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token."
+            )
+        token_cache.set(token, payload)
+
+    if token_type(payload) != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired."
+            detail="Invalid token type. Use an access token."
         )
-    except jwt.InvalidTokenError as e:
-        logger.error("JWT verification error: %s", e)
+
+    # Checked on cache hits too, revocation is a set lookup, not a signature check
+    if await revocation_store.is_revoked(payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token."
+            detail="Token has been revoked."
         )
 
     return payload
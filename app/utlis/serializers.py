@@ -0,0 +1,57 @@
+from fastapi.responses import ORJSONResponse
+from app.schemas import AuthToken, UserOut, UserOutCreated, IntrospectResponse, TokenIntrospection
+
+"""
+# Prebuilt serializers
+# Hot routes return these responses directly, so FastAPI skips re-validating the data against the route's
+# response_model and the jsonable_encoder pass. The response_model stays on the route for the OpenAPI docs.
+# Each builder is checked against its schema's fields at import, a schema change can't silently drift.
+"""
+
+
+def _check_fields(schema, keys):
+    if set(schema.__fields__) != set(keys):
+        raise RuntimeError(f"Serializer for {schema.__name__} is out of sync: {sorted(keys)} "
+                           f"vs {sorted(schema.__fields__)}")
+
+
+def token_pair(access_token: str, refresh_token: str) -> dict:
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def token_response(tokens: dict) -> ORJSONResponse:
+    return ORJSONResponse(tokens)
+
+
+def user_out(user) -> dict:
+    """From an ORM User or a cached UserRecord"""
+    return {
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "is_active": bool(user.is_active),
+    }
+
+
+def user_response(user) -> ORJSONResponse:
+    return ORJSONResponse(user_out(user))
+
+
+def user_created_response(user_uuid) -> ORJSONResponse:
+    return ORJSONResponse({"uuid": user_uuid})  # orjson writes UUIDs natively
+
+
+def introspection_result(active: bool, token_type=None, claims=None, exp=None, revoked=False, error=None) -> dict:
+    return {"active": active, "token_type": token_type, "claims": claims, "exp": exp, "revoked": revoked,
+            "error": error}
+
+
+def introspect_response(results: list) -> ORJSONResponse:
+    return ORJSONResponse({"results": results})
+
+
+_check_fields(AuthToken, token_pair("", ""))
+_check_fields(UserOut, user_out(UserOut(email="", first_name="", last_name="", is_active=False)))
+_check_fields(UserOutCreated, ("uuid",))
+_check_fields(IntrospectResponse, ("results",))
+_check_fields(TokenIntrospection, introspection_result(False))
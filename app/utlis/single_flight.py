@@ -0,0 +1,78 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key in this worker: the first caller runs the lookup, the ones
+    arriving while it's in flight await its result (or exception) instead of running their own.
+    A waiter past `max_waiters` or `timeout` seconds runs the lookup itself, so one slow query can't stall a queue.
+    """
+
+    def __init__(self, max_waiters: int = 1000, timeout: float = 2.0, enabled: bool = True):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self.enabled = enabled
+        self._flights = {}  # key -> [future, waiter count]
+        self.leaders = 0
+        self.coalesced = 0
+        self.overflows = 0
+        self.timeouts = 0
+
+    async def do(self, key: str, func):
+        """Returns await func(), shared with every concurrent call for `key`"""
+        if not self.enabled:
+            return await func()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            future, waiters = flight
+            if waiters >= self.max_waiters:
+                self.overflows += 1
+                return await func()
+            flight[1] += 1
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                self.coalesced += 1
+                return result
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return await func()
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This caller was cancelled, not the lookup
+                return await func()
+            finally:
+                flight[1] -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = [future, 0]
+        self.leaders += 1
+        try:
+            result = await func()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()  # Waiters run the lookup themselves
+            else:
+                future.set_exception(e)
+                future.exception()  # Retrieved, no warning when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key, (None,))[0] is future:
+                del self._flights[key]
+
+    def forget(self, *keys: str):
+        """Callers arriving after a write start a fresh lookup instead of joining one that may predate it"""
+        for key in keys:
+            self._flights.pop(key, None)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "overflows": self.overflows,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,113 @@
+import os
+import json
+import base64
+import hashlib
+import datetime
+from calendar import timegm
+import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_encode
+from cryptography.hazmat.primitives import serialization
+from app.config import PRIVATE_KEY, PUBLIC_KEY, JWT_ALGORITHM, JWT_KID, JWT_PUBLIC_KEYS_DIR
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return timegm(value.utctimetuple())
+    return value
+
+
+def key_id(public_key) -> str:
+    """Stable kid for a public key: truncated sha256 of its DER SubjectPublicKeyInfo"""
+    der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return base64.urlsafe_b64encode(hashlib.sha256(der).digest()[:12]).decode()
+
+
+def load_public_keys_dir(path: str) -> dict:
+    """Reads `<kid>.pem` files, the retired (verify-only) keys of a rotation"""
+    keys = {}
+    if not path or not os.path.isdir(path):
+        return keys
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".pem"):
+            with open(os.path.join(path, name), "r", encoding="utf-8") as file:
+                keys[name[:-len(".pem")]] = file.read()
+    return keys
+
+
+class TokenService:
+    """
+    Signs and verifies JWTs with key objects parsed once.
+    PyJWT would otherwise re-parse the PEM strings on every encode/decode, which costs more than
+    the RSA operation itself for verification.
+
+    Holds a key ring indexed by `kid`: tokens are signed with the active key and its kid goes into the
+    header, verification picks the key by the header's kid so retired keys keep working during a rotation.
+    """
+
+    def __init__(self, private_key: str, public_key: str, algorithm: str = "RS256", kid: str = None,
+                 extra_public_keys: dict = None):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise ValueError(f"Unsupported JWT algorithm '{algorithm}'")
+
+        self.algorithm = algorithm
+        self._alg = algorithms[algorithm]
+        try:
+            self._private_key = self._alg.prepare_key(private_key)
+            self._public_key = self._alg.prepare_key(public_key)
+            retired = {key_kid: self._alg.prepare_key(pem) for key_kid, pem in (extra_public_keys or {}).items()}
+        except Exception as e:
+            raise ValueError(f"Invalid JWT key configuration: {e}") from e
+
+        self.kid = kid or key_id(self._public_key)
+        self._keys = {**retired, self.kid: self._public_key}
+
+        header = json.dumps({"alg": algorithm, "kid": self.kid, "typ": "JWT"}, separators=(",", ":")).encode()
+        self._header_segment = base64url_encode(header)
+        self._jwks = None
+
+    @classmethod
+    def from_config(cls):
+        return cls(PRIVATE_KEY, PUBLIC_KEY, JWT_ALGORITHM, kid=JWT_KID,
+                   extra_public_keys=load_public_keys_dir(JWT_PUBLIC_KEYS_DIR))
+
+    def sign(self, payload: dict) -> str:
+        claims = {key: _to_timestamp(value) for key, value in payload.items()}
+        payload_segment = base64url_encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = self._header_segment + b"." + payload_segment
+        signature = self._alg.sign(signing_input, self._private_key)
+        return (signing_input + b"." + base64url_encode(signature)).decode()
+
+    def verify(self, token: str) -> dict:
+        """Returns the claims or raises jwt.InvalidTokenError (incl. ExpiredSignatureError)"""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            key = self._public_key  # Issued before key ids were introduced
+        else:
+            key = self._keys.get(kid)
+            if key is None:
+                raise jwt.InvalidTokenError(f"Unknown key id '{kid}'")
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+    def jwks(self):
+        """Returns (body, etag) of the JSON Web Key Set, built once"""
+        if self._jwks is None:
+            keys = []
+            for key_kid, key in self._keys.items():
+                jwk = json.loads(self._alg.to_jwk(key))
+                jwk.update(kid=key_kid, alg=self.algorithm, use="sig")
+                keys.append(jwk)
+            body = json.dumps({"keys": keys}, separators=(",", ":"), sort_keys=True).encode()
+            self._jwks = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+        return self._jwks
+
+
+_token_service = None
+
+
+def get_token_service() -> TokenService:
+    global _token_service
+    if _token_service is None:
+        _token_service = TokenService.from_config()
+    return _token_service
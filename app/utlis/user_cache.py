@@ -0,0 +1,277 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from app.models import AuthProviderEnum
+from app.config import (USER_CACHE_BACKEND,
+                        USER_CACHE_SIZE,
+                        USER_CACHE_TTL,
+                        USER_CACHE_NEGATIVE_TTL,
+                        USER_CACHE_REDIS_URL,
+                        USER_LOOKUP_COALESCE,
+                        USER_LOOKUP_MAX_WAITERS,
+                        USER_LOOKUP_WAIT_TIMEOUT,
+                        DB_REPLICA_URLS,
+                        DB_REPLICA_MAX_LAG_SECONDS,
+                        DB_REPLICA_HEALTH_INTERVAL,
+                        logger)
+from app.logs import SAMPLED
+from app.utlis.single_flight import SingleFlight
+
+NEGATIVE = "-"  # Stored under an email key when no such user exists
+TRACKED_INVALIDATIONS = 10000  # Recent invalidations remembered to reject stale loads, see UserCache.generation
+
+
+"""
+# Record
+"""
+
+class UserRecord:
+    """
+    Detached, read-only snapshot of a users row. Never use it for writes, load the ORM User for that.
+    The password hash is only set on records loaded from the database, it's never written to the cache.
+    """
+
+    __slots__ = ("uuid", "email", "is_active", "hashed_password", "first_name", "last_name", "auth_provider")
+
+    def __init__(self, uuid, email, is_active, hashed_password, first_name, last_name, auth_provider):
+        self.uuid = uuid
+        self.email = email
+        self.is_active = is_active
+        self.hashed_password = hashed_password
+        self.first_name = first_name
+        self.last_name = last_name
+        self.auth_provider = auth_provider
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.uuid, user.email, bool(user.is_active), user.hashed_password,
+                   user.first_name, user.last_name, user.auth_provider or AuthProviderEnum.EMAIL)
+
+    def dumps(self) -> str:
+        # Positional JSON array keeps the cached value small
+        return json.dumps([str(self.uuid), self.email, self.is_active,
+                           self.first_name, self.last_name, self.auth_provider.value], separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, data: str):
+        values = json.loads(data)
+        if len(values) == 7:
+            del values[3]  # Cached before hashes were left out
+        user_uuid, email, is_active, first_name, last_name, provider = values
+        return cls(uuid.UUID(user_uuid), email, is_active, None, first_name, last_name, AuthProviderEnum(provider))
+
+    def __repr__(self):
+        return f"<UserRecord {self.uuid} {self.email}>"
+
+
+"""
+# Backends
+"""
+
+class MemoryCacheBackend:
+    """Per-process TTL + LRU store. Invalidations don't reach other workers, use redis when running several"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend:
+    """Shared store on the redis instance Celery already uses. Failures degrade to cache misses"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str):
+        try:
+            return await self._redis.get(key)
+        except Exception as e:
+            logger.error("User cache read failed: %s", e, extra=SAMPLED)
+            return None
+
+    async def set(self, key: str, value: str, ttl: int):
+        try:
+            await self._redis.set(key, value, ex=ttl)
+        except Exception as e:
+            logger.error("User cache write failed: %s", e, extra=SAMPLED)
+
+    async def delete(self, *keys: str):
+        try:
+            await self._redis.delete(*keys)
+        except Exception as e:
+            logger.error("User cache invalidation failed: %s", e)
+
+
+"""
+# Cache
+"""
+
+class UserCache:
+    def __init__(self, backend, ttl: int = 300, negative_ttl: int = 60, write_window: int = 0,
+                 lookups: SingleFlight = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # With read replicas: how long after a write the user is read from the primary only
+        self.write_window = write_window
+        self._markers = backend if backend is not None else MemoryCacheBackend()
+        # Database loads on a miss, keyed like the cache entries they fill
+        self.lookups = lookups if lookups is not None else SingleFlight(enabled=False)
+        # Bumped by every invalidate, keys map to the generation of their last one
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._untracked = 0  # Newest generation dropped from _invalidated
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _uuid_key(user_uuid) -> str:
+        return f"user:u:{user_uuid}"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"user:e:{email}"
+
+    @staticmethod
+    def _credentials_key(email: str) -> str:
+        return f"user:c:{email}"  # Single-flight only, credentials are never cached
+
+    @staticmethod
+    def _written_key(key: str) -> str:
+        return f"user:w:{key}"
+
+    def generation(self) -> int:
+        """Taken before a database load and passed to set(), which drops the result if the user changed since"""
+        return self._generation
+
+    def _changed_since(self, generation, keys) -> bool:
+        if generation is None:
+            return False
+        if self._untracked > generation:
+            return True  # Can't tell any more, don't risk it
+        return any(self._invalidated.get(key, 0) > generation for key in keys)
+
+    async def _get(self, key: str):
+        """Returns (found, record), record is None for a cached miss"""
+        if self.backend is None:
+            return False, None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, None if value == NEGATIVE else UserRecord.loads(value)
+
+    async def get_by_uuid(self, user_uuid):
+        return await self._get(self._uuid_key(user_uuid))
+
+    async def get_by_email(self, email: str):
+        return await self._get(self._email_key(email))
+
+    async def load_by_uuid(self, user_uuid, func):
+        """Runs the database load for a miss, shared with concurrent loads of the same user"""
+        return await self.lookups.do(self._uuid_key(user_uuid), func)
+
+    async def load_credentials(self, email: str, func):
+        """Login's load from the primary, coalesced apart from the cache fills since its record has the hash"""
+        return await self.lookups.do(self._credentials_key(email), func)
+
+    async def set(self, record: UserRecord, generation: int = None):
+        if self.backend is None:
+            return
+        keys = (self._uuid_key(record.uuid), self._email_key(record.email))
+        if self._changed_since(generation, keys):
+            return
+        value = record.dumps()
+        for key in keys:
+            await self.backend.set(key, value, self.ttl)
+
+    async def set_missing_email(self, email: str, generation: int = None):
+        if self.backend is None:
+            return
+        key = self._email_key(email)
+        if self._changed_since(generation, (key,)):
+            return
+        await self.backend.set(key, NEGATIVE, self.negative_ttl)
+
+    async def invalidate(self, user_uuid=None, *emails: str):
+        """Called after every write of a user, so it also starts the primary-only window"""
+        keys = [self._email_key(email) for email in emails if email]
+        if user_uuid:
+            keys.append(self._uuid_key(user_uuid))
+        if not keys:
+            return
+        self._generation += 1
+        for key in keys:
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+        while len(self._invalidated) > TRACKED_INVALIDATIONS:
+            self._untracked = self._invalidated.popitem(last=False)[1]
+        self.lookups.forget(*keys, *(self._credentials_key(email) for email in emails if email))
+        if self.backend is not None:
+            await self.backend.delete(*keys)
+        if self.write_window:
+            for key in keys:
+                await self._markers.set(self._written_key(key), "1", self.write_window)
+
+    async def recently_written(self, user_uuid=None, email: str = None) -> bool:
+        """True while a replica may still serve the row from before the last write"""
+        if not self.write_window:
+            return False
+        if user_uuid and await self._markers.get(self._written_key(self._uuid_key(user_uuid))):
+            return True
+        return bool(email and await self._markers.get(self._written_key(self._email_key(email))))
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": USER_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+def create_backend(kind: str):
+    if kind == "redis":
+        return RedisCacheBackend(USER_CACHE_REDIS_URL)
+    if kind == "memory":
+        return MemoryCacheBackend(max_size=USER_CACHE_SIZE)
+    return None  # "none" disables caching
+
+
+user_cache = UserCache(
+    create_backend(USER_CACHE_BACKEND),
+    ttl=USER_CACHE_TTL,
+    negative_ttl=USER_CACHE_NEGATIVE_TTL,
+    # A replica further behind than the max lag is ejected within one health check interval
+    write_window=int(DB_REPLICA_MAX_LAG_SECONDS + DB_REPLICA_HEALTH_INTERVAL) + 1 if DB_REPLICA_URLS else 0,
+    lookups=SingleFlight(
+        max_waiters=USER_LOOKUP_MAX_WAITERS,
+        timeout=USER_LOOKUP_WAIT_TIMEOUT,
+        enabled=USER_LOOKUP_COALESCE
+    ),
+)
@@ -1,80 +1,226 @@
 from fastapi import HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User, AuthProviderEnum
 from app.utlis.security import generate_uuid, generate_hashed_password, create_email_confirmation_token
-from app.database import get_db
+from app.config import logger
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from app.database import get_db, get_read_db, get_sessionmaker, replica_name, replica_router
 from app.utlis.security import verify_token
+from app.utlis.user_cache import user_cache, UserRecord
 
 
-async def get_user_by_email(db, user_email):
-    return db.query(User).filter(User.email == user_email).first()
+async def _load_user(db, condition, user_uuid=None, email=None):
+    """
+    Loads one user through `db`, which may be a replica session (get_read_db). The primary answers instead
+    when the user was written moments ago, when the replica fails (it's ejected) or doesn't have the row:
+    it may just not have arrived there yet.
+    """
+    replica = replica_name(db)
+    if replica is None:
+        return await db.scalar(select(User).where(condition))
 
-def get_current_user(
+    if not await user_cache.recently_written(user_uuid, email):
+        try:
+            user = await db.scalar(select(User).where(condition))
+            if user is not None:
+                return user
+        except (OSError, SQLAlchemyError) as e:
+            replica_router.eject(replica, e)
+
+    async with get_sessionmaker()() as primary:
+        return await primary.scalar(select(User).where(condition))
+
+
+async def email_taken(db, email: str) -> bool:
+    """Authoritative check on `db` (the primary): no cache, no replica that may not have the row yet"""
+    return await db.scalar(select(User.id).where(User.email == email)) is not None
+
+
+async def get_user_credentials(db, user_email):
+    """
+    Login's lookup: the password hash is read through `db`, a replica session (get_read_db), and never from the
+    cache. Like every replica read it comes from the primary for an email written in the last seconds (a password
+    change or deletion), or one the replica doesn't have. Only unknown emails, confirmed by the primary, are
+    answered from the cache, a credential-stuffing run doesn't reach Postgres. Returns a UserRecord with the hash.
+    """
+    found, record = await user_cache.get_by_email(user_email)
+    if found and record is None:
+        return None  # Cached as unknown, sign-up and email changes invalidate it
+
+    async def load():
+        generation = user_cache.generation()
+        user = await _load_user(db, User.email == user_email, email=user_email)
+        if not user:
+            await user_cache.set_missing_email(user_email, generation)
+            return None
+        loaded = UserRecord.from_user(user)
+        await user_cache.set(loaded, generation)  # The hash isn't cached, the profile is
+        return loaded
+
+    return await user_cache.load_credentials(user_email, load)
+
+
+async def get_user_record_by_uuid(db, user_uuid):
+    found, record = await user_cache.get_by_uuid(user_uuid)
+    if found:
+        return record
+
+    async def load():
+        generation = user_cache.generation()
+        user = await _load_user(db, User.uuid == user_uuid, user_uuid=user_uuid)
+        if not user:
+            return None
+        loaded = UserRecord.from_user(user)
+        await user_cache.set(loaded, generation)
+        return loaded
+
+    return await user_cache.load_by_uuid(user_uuid, load)
+
+
+class CurrentPrincipal:
+    """
+    Caller identity built from verified access token claims only.
+    The ORM user is loaded on the first get_user() call, so handlers that only need the
+    uuid/is_active/provider never touch the database.
+    """
+
+    def __init__(self, payload: dict, db: AsyncSession, read_db: AsyncSession = None):
+        self.uuid = payload["uuid"]
+        self.email = payload.get("email")
+        self.is_active = payload.get("is_active", False)
+        self.provider = payload.get("provider", AuthProviderEnum.EMAIL.value)
+        self.claims = payload
+        self._db = db
+        self._read_db = read_db if read_db is not None else db
+        self._user = None
+
+    async def get_user(self) -> User:
+        if self._user is None:
+            user = await self._db.scalar(select(User).where(User.uuid == self.uuid))
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found."
+                )
+            self._user = user
+        return self._user
+
+    async def get_record(self) -> UserRecord:
+        """Cached read-only view of the user, for handlers that don't modify it"""
+        if self._user is not None:
+            return UserRecord.from_user(self._user)
+        record = await get_user_record_by_uuid(self._read_db, self.uuid)
+        if not record:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found."
+            )
+        return record
+
+
+async def get_current_principal(
     payload: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
-) -> User:
-    user_uuid = payload.get("uuid")
-    if not user_uuid:
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+) -> CurrentPrincipal:
+    if not payload.get("uuid"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload."
         )
-    user = db.query(User).filter(User.uuid == user_uuid).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found."
-        )
-    return user
+    return CurrentPrincipal(payload, db, read_db)
+
+
+async def get_current_user(
+    principal: CurrentPrincipal = Depends(get_current_principal)
+) -> User:
+    return await principal.get_user()
+
 
+async def delete_user_by_uuid(db, user_uuid) -> bool:
+    result = await db.execute(delete(User).where(User.uuid == user_uuid).returning(User.email))
+    deleted = result.first()
+    await db.commit()
+    if deleted is None:
+        return False
+    await user_cache.invalidate(user_uuid, deleted.email)
+    return True
+
+
+async def rehash_password(user_uuid, email: str, password: str, old_hash: str):
+    """
+    Stores a hash at the current cost after a login with an outdated one. Runs after the response on its own
+    session, and only replaces `old_hash`, so a password changed in the meantime wins.
+    """
+    try:
+        new_hash = await generate_hashed_password(password)
+        async with get_sessionmaker()() as db:
+            result = await db.execute(
+                update(User)
+                .where(User.uuid == user_uuid, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await db.commit()
+        if result.rowcount:
+            await user_cache.invalidate(user_uuid, email)
+    except Exception as e:
+        # The old hash keeps working, the next login tries again
+        logger.warning("Password rehash for user %s failed: %s", user_uuid, e)
+
+
+async def process_user_creation(db, user):
+    """
+    Registers the user with a single INSERT ... ON CONFLICT (email) DO NOTHING RETURNING uuid.
+    The uuid and confirmation token are generated up front, a duplicate email comes back as an empty RETURNING.
+    """
+    found, existing = await user_cache.get_by_email(user.email)
+    if found and existing and await email_taken(db, user.email):
+        # Known duplicate, skip the hash. Confirmed on the primary, the entry may predate a delete on another worker
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-def process_user_creation(db, user):
     user_uuid = generate_uuid()
+    values = dict(
+        uuid=user_uuid,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+    )
 
     if user.password:
-        hashed_password = generate_hashed_password(user.password)
-        db_user = User(
-            uuid=user_uuid,
-            email=user.email,
-            hashed_password=hashed_password,
-            first_name=user.first_name,
-            last_name=user.last_name,
+        values.update(
+            hashed_password=await generate_hashed_password(user.password),
             auth_provider=AuthProviderEnum.EMAIL,
             is_active=False
         )
     elif user.third_party_id:
         if user.auth_provider == "google":
-            db_user = User(
-                uuid=user_uuid,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                auth_provider=AuthProviderEnum.GOOGLE,
-                third_party_id=user.third_party_id,
-                is_active=True
-            )
+            values.update(auth_provider=AuthProviderEnum.GOOGLE, third_party_id=user.third_party_id, is_active=True)
         elif user.auth_provider == "apple":
-            db_user = User(
-                uuid=user_uuid,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                auth_provider=AuthProviderEnum.APPLE,
-                third_party_id=user.third_party_id,
-                is_active=True
-            )
+            values.update(auth_provider=AuthProviderEnum.APPLE, third_party_id=user.third_party_id, is_active=True)
         else:
             raise HTTPException(status_code=400, detail="Unsupported third-party provider")
     else:
         raise HTTPException(status_code=400, detail="Password or third-party ID must be provided")
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
     confirmation_token = create_email_confirmation_token(user_uuid)
 
-    db_user.confirmation_token = confirmation_token
-    db.commit()
+    statement = (
+        insert(User)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.uuid)
+    )
+    try:
+        created_uuid = (await db.execute(statement)).scalar()
+        await db.commit()
+    except IntegrityError:
+        # The email conflict is handled above, this is another unique column (third_party_id)
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Account already registered")
+
+    if created_uuid is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-    return db_user, confirmation_token
+    return created_uuid, confirmation_token
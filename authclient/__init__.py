@@ -0,0 +1,28 @@
+"""
+Local JWT verification for services that trust this auth service.
+
+    from authclient import JWKSClient, TokenVerifier, AuthMiddleware
+
+    verifier = TokenVerifier(JWKSClient("https://auth.internal/.well-known/jwks.json"))
+    app.add_middleware(AuthMiddleware, verifier=verifier)
+
+Only depends on PyJWT and cryptography.
+"""
+from authclient.errors import AuthClientError, InvalidTokenError, ExpiredTokenError, KeyNotFoundError
+from authclient.jwks import JWKSClient, StaticKeys
+from authclient.cache import VerifiedTokenCache
+from authclient.verifier import TokenVerifier
+from authclient.middleware import AuthMiddleware, get_claims
+
+__all__ = [
+    "AuthClientError",
+    "InvalidTokenError",
+    "ExpiredTokenError",
+    "KeyNotFoundError",
+    "JWKSClient",
+    "StaticKeys",
+    "VerifiedTokenCache",
+    "TokenVerifier",
+    "AuthMiddleware",
+    "get_claims",
+]
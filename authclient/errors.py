@@ -0,0 +1,14 @@
+class AuthClientError(Exception):
+    pass
+
+
+class InvalidTokenError(AuthClientError):
+    pass
+
+
+class ExpiredTokenError(InvalidTokenError):
+    pass
+
+
+class KeyNotFoundError(InvalidTokenError):
+    pass
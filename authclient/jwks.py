@@ -0,0 +1,138 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+import urllib.request
+import urllib.error
+from jwt.algorithms import get_default_algorithms
+from authclient.errors import KeyNotFoundError
+
+logger = logging.getLogger("authclient")
+
+
+class StaticKeys:
+    """Fixed key set, for services that are handed a PEM instead of the JWKS url"""
+
+    def __init__(self, public_key: str, algorithm: str = "RS256", kid: str = None):
+        self._key = get_default_algorithms()[algorithm].prepare_key(public_key)
+        self._kid = kid
+
+    def get_key(self, kid):
+        if self._kid is not None and kid is not None and kid != self._kid:
+            raise KeyNotFoundError(f"Unknown key id '{kid}'")
+        return self._key
+
+    async def get_key_async(self, kid):
+        return self.get_key(kid)
+
+    def close(self):
+        pass
+
+
+class JWKSClient:
+    """
+    Fetches the auth service's /.well-known/jwks.json and keeps the parsed keys in memory.
+    A daemon thread fetches them on start and then every `refresh_interval` seconds (conditional GET on the
+    ETag), an unknown kid triggers an immediate refresh at most once per `min_refresh_interval`.
+    Async callers use get_key_async(), which runs that refresh on the default executor instead of the event loop.
+    """
+
+    def __init__(self, url: str, refresh_interval: float = 300, min_refresh_interval: float = 10,
+                 timeout: float = 5, background: bool = True):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        self._keys = {}
+        self._etag = None
+        self._last_fetch = float("-inf")
+        self._lock = threading.Lock()  # Guards _last_fetch and the key/etag swap, never held over the network
+        self._stop = threading.Event()
+        self._started = threading.Event()  # Set once the background thread's first fetch is done
+        self._thread = None
+
+        if background:
+            self._thread = threading.Thread(target=self._run, name="authclient-jwks", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("JWKS refresh failed, keeping the cached keys: %s", e)
+            self._started.set()
+            if self._stop.wait(self.refresh_interval):
+                return
+
+    def refresh(self):
+        with self._lock:
+            self._last_fetch = time.monotonic()
+            etag = self._etag
+
+        request = urllib.request.Request(self.url, headers={"Accept": "application/json"})
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                document = json.loads(response.read())
+                etag = response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return
+            raise
+
+        algorithms = get_default_algorithms()
+        keys = {}
+        for jwk in document.get("keys", []):
+            algorithm = algorithms.get(jwk.get("alg", "RS256"))
+            if algorithm is None:
+                continue
+            keys[jwk.get("kid")] = algorithm.from_jwk(json.dumps(jwk))
+        with self._lock:
+            self._keys = keys  # Swapped in one assignment, readers never see a partial set
+            self._etag = etag
+
+    def _refresh_if_due(self):
+        """Refresh for an unknown kid, at most once per min_refresh_interval however many callers miss"""
+        if self._thread is not None and not self._started.is_set():
+            self._started.wait(self.timeout)  # Keys are still on their way, the first fetch answers this too
+            return
+        with self._lock:
+            if time.monotonic() - self._last_fetch < self.min_refresh_interval:
+                return
+            self._last_fetch = time.monotonic()  # Claimed before fetching, concurrent misses don't pile up
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("JWKS refresh failed: %s", e)
+
+    def _lookup(self, kid):
+        key = self._keys.get(kid)
+        if key is None and kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        return key
+
+    def get_key(self, kid):
+        """Blocks on the refresh for an unknown kid, use get_key_async() from async code"""
+        key = self._lookup(kid)
+        if key is None:
+            self._refresh_if_due()
+            key = self._lookup(kid)
+            if key is None:
+                raise KeyNotFoundError(f"Unknown key id '{kid}'")
+        return key
+
+    async def get_key_async(self, kid):
+        key = self._lookup(kid)
+        if key is None:
+            await asyncio.get_running_loop().run_in_executor(None, self._refresh_if_due)
+            key = self._lookup(kid)
+            if key is None:
+                raise KeyNotFoundError(f"Unknown key id '{kid}'")
+        return key
+
+    def close(self):
+        self._stop.set()
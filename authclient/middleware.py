@@ -0,0 +1,56 @@
+import json
+from authclient.errors import AuthClientError, ExpiredTokenError
+
+
+class AuthMiddleware:
+    """
+    ASGI middleware: verifies the bearer token of every http request and stores the claims in
+    scope["auth"]. With `required=True` requests without a valid token get a 401, otherwise scope["auth"]
+    is None and the route decides. Paths starting with any of `exclude_paths` are passed through.
+    """
+
+    def __init__(self, app, verifier, required: bool = True, exclude_paths=()):
+        self.app = app
+        self.verifier = verifier
+        self.required = required
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            return await self.app(scope, receive, send)
+
+        authorization = None
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+
+        claims = None
+        if authorization is not None or self.required:
+            try:
+                claims = await self.verifier.verify_authorization_async(authorization)
+            except AuthClientError as e:
+                if self.required:
+                    return await self._reject(send, "Token has expired." if isinstance(e, ExpiredTokenError) else str(e))
+
+        scope["auth"] = claims
+        return await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"www-authenticate", b"Bearer"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def get_claims(request) -> dict:
+    """FastAPI/Starlette dependency: claims set by AuthMiddleware, None for an anonymous request"""
+    return request.scope.get("auth")
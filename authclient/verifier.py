@@ -0,0 +1,68 @@
+import jwt
+from authclient.cache import VerifiedTokenCache
+from authclient.errors import InvalidTokenError, ExpiredTokenError
+
+
+def token_type(claims: dict) -> str:
+    # Same rule as the auth service: tokens issued before "typ" existed only had a "sub" when refresh tokens
+    return claims.get("typ") or ("refresh" if "sub" in claims else "access")
+
+
+class TokenVerifier:
+    """
+    Verifies access tokens locally: key picked by the header kid, verified claims cached by token digest
+    so repeats of the same bearer token cost a dict lookup. Refresh tokens are rejected.
+    """
+
+    def __init__(self, keys, algorithms=("RS256",), cache_size: int = 10000, leeway: float = 0):
+        self.keys = keys
+        self.algorithms = list(algorithms)
+        self.cache = VerifiedTokenCache(cache_size)
+        self.leeway = leeway
+
+    def _decode(self, token: str, key) -> dict:
+        try:
+            claims = jwt.decode(token, key, algorithms=self.algorithms, leeway=self.leeway)
+        except jwt.ExpiredSignatureError as e:
+            raise ExpiredTokenError("Token has expired.") from e
+        except jwt.InvalidTokenError as e:
+            raise InvalidTokenError("Invalid token.") from e
+        if token_type(claims) != "access":
+            # A refresh token lives for days, it must never pass as a bearer token
+            raise InvalidTokenError("Invalid token type.")
+        self.cache.set(token, claims)
+        return claims
+
+    @staticmethod
+    def _kid(token: str):
+        try:
+            return jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as e:
+            raise InvalidTokenError("Invalid token.") from e
+
+    def verify(self, token: str) -> dict:
+        claims = self.cache.get(token)
+        if claims is not None:
+            return claims
+        return self._decode(token, self.keys.get_key(self._kid(token)))
+
+    async def verify_async(self, token: str) -> dict:
+        """Same as verify(), a key refresh for an unknown kid doesn't block the event loop"""
+        claims = self.cache.get(token)
+        if claims is not None:
+            return claims
+        return self._decode(token, await self.keys.get_key_async(self._kid(token)))
+
+    @staticmethod
+    def _bearer(authorization: str) -> str:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise InvalidTokenError("Invalid authorization header format. Expected 'Bearer <token>'.")
+        return token.strip()
+
+    def verify_authorization(self, authorization: str) -> dict:
+        """Verifies a 'Bearer <token>' header value"""
+        return self.verify(self._bearer(authorization))
+
+    async def verify_authorization_async(self, authorization: str) -> dict:
+        return await self.verify_async(self._bearer(authorization))
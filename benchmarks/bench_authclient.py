@@ -0,0 +1,36 @@
+"""
+authclient verifications per second on one core, without (cold) and with (warm) the verified-token cache.
+
+Run from the repo root:
+    python -m benchmarks.bench_authclient [seconds]
+"""
+import sys
+import time
+from authclient import StaticKeys, TokenVerifier
+from app.utlis.tokens import TokenService
+from benchmarks.bench_tokens import generate_keys, payload
+
+
+def rate(func, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func()
+        count += 100
+    return count / seconds
+
+
+def main(seconds=2.0):
+    private_pem, public_pem = generate_keys()
+    token = TokenService(private_pem, public_pem, "RS256").sign(payload())
+
+    cold = TokenVerifier(StaticKeys(public_pem), cache_size=0)
+    warm = TokenVerifier(StaticKeys(public_pem))
+
+    print(f"{'cold (RS256 verify)':<24} {rate(lambda: cold.verify(token), seconds):>12,.0f} verifications/s/core")
+    print(f"{'warm (cache hit)':<24} {rate(lambda: warm.verify(token), seconds):>12,.0f} verifications/s/core")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
@@ -0,0 +1,68 @@
+"""
+Response serialization cost of the hot routes: FastAPI's default path (validate the returned data against the
+route's response_model, jsonable_encoder, stdlib json) against the prebuilt ORJSONResponse from
+app.utlis.serializers. No database or network needed:
+    python -m benchmarks.bench_serialization [--seconds 2] [--output results.json]
+"""
+import uuid
+import asyncio
+import argparse
+from benchmarks.micro import ensure_keys, measure_async
+from benchmarks.results import save_results, print_table
+
+
+async def run(seconds: float) -> dict:
+    # Imported here, the app config reads the keys at import time
+    from fastapi.routing import serialize_response
+    from fastapi.responses import JSONResponse
+    from app.main import app
+    from app.models import AuthProviderEnum
+    from app.utlis.user_cache import UserRecord
+    from app.utlis.security import create_access_token, create_refresh_token, decode_access_token
+    from app.utlis.serializers import token_pair, token_response, user_response, introspect_response, \
+        introspection_result
+
+    routes = {(route.path, method): route for route in app.routes if hasattr(route, "methods")
+              for method in route.methods}
+    user_uuid = str(uuid.uuid4())
+    tokens = token_pair(create_access_token("bench@example.com", user_uuid),
+                        create_refresh_token("bench@example.com", user_uuid))
+    record = UserRecord(uuid.UUID(user_uuid), "bench@example.com", True, "hash", "Bench", "User",
+                        AuthProviderEnum.EMAIL)
+    payload = decode_access_token(tokens["access_token"])
+    results = [introspection_result(True, "access", payload, payload["exp"]) for _ in range(100)]
+
+    cases = {
+        "AuthToken": (routes[("/auth/login", "POST")], tokens, token_response),
+        "UserOut": (routes[("/users", "GET")], record, user_response),
+        "IntrospectResponse 100": (routes[("/auth/introspect", "POST")], {"results": results},
+                                   lambda content: introspect_response(content["results"])),
+    }
+    measured = {}
+    for name, (route, content, build) in cases.items():
+        async def default_path():
+            value = await serialize_response(field=route.secure_cloned_response_field, response_content=content)
+            return JSONResponse(value).body
+
+        async def fast_path():
+            return build(content).body
+
+        measured[f"{name} (default)"] = await measure_async(default_path, seconds)
+        measured[f"{name} (orjson)"] = await measure_async(fast_path, seconds)
+    return measured
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_serialization")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Per benchmark")
+    parser.add_argument("--output", help="JSON file, defaults to benchmarks/results/serialization-<commit>.json")
+    args = parser.parse_args(argv)
+
+    ensure_keys()
+    results = asyncio.run(run(args.seconds))
+    print_table(results)
+    save_results("serialization", results, args.output, params={"seconds": args.seconds})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Per-token sign/verify cost: raw PEM strings passed to PyJWT (before) vs TokenService (after).
+
+Run from the repo root:
+    python -m benchmarks.bench_tokens [iterations]
+"""
+import sys
+import uuid
+import timeit
+import datetime
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app.utlis.tokens import TokenService
+
+
+def generate_keys():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private_pem, public_pem
+
+
+def payload():
+    return {
+        "uuid": str(uuid.uuid4()),
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=30),
+        "jti": str(uuid.uuid4()),
+    }
+
+
+def report(name, seconds, iterations):
+    print(f"{name:<28} {seconds / iterations * 1e6:>10.1f} us/token")
+
+
+def main(iterations=500):
+    private_pem, public_pem = generate_keys()
+    service = TokenService(private_pem, public_pem, "RS256")
+    token = service.sign(payload())
+
+    report("sign   (PEM per call)", timeit.timeit(lambda: jwt.encode(payload(), private_pem, algorithm="RS256"), number=iterations), iterations)
+    report("sign   (TokenService)", timeit.timeit(lambda: service.sign(payload()), number=iterations), iterations)
+    report("verify (PEM per call)", timeit.timeit(lambda: jwt.decode(token, public_pem, algorithms=["RS256"]), number=iterations), iterations)
+    report("verify (TokenService)", timeit.timeit(lambda: service.verify(token), number=iterations), iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,57 @@
+"""
+Compares two result files from the same suite, e.g. the micro-benchmarks of two commits:
+    python -m benchmarks.compare benchmarks/results/micro-<old>.json benchmarks/results/micro-<new>.json
+
+Exits with 1 when a p50 or p95 got slower than --threshold (default 10%), usable as a CI gate.
+"""
+import sys
+import json
+import argparse
+
+METRICS = ("throughput_per_second", "p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline["suite"] != candidate["suite"]:
+        print(f"Different suites: {baseline['suite']} vs {candidate['suite']}", file=sys.stderr)
+        return 2
+
+    print(f"{baseline['suite']}: {baseline['commit']} -> {candidate['commit']}")
+    print(f"{'benchmark':<34} " + " ".join(f"{metric:>24}" for metric in METRICS))
+    regressions = []
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            delta = change(old[metric], new[metric])
+            cells.append(f"{new[metric]:>12.3f} ({delta:+7.1f}%)")
+            if metric in ("p50_ms", "p95_ms") and delta > args.threshold:
+                regressions.append(f"{name} {metric} {delta:+.1f}%")
+        print(f"{name:<34} " + " ".join(cells))
+
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
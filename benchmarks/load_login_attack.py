@@ -0,0 +1,77 @@
+"""
+Login latency of a legitimate user while a credential-stuffing attack runs against /auth/login.
+
+Needs a running server and an existing, confirmed account:
+    python -m benchmarks.load_login_attack --url http://127.0.0.1:8000 --email me@example.com --password secret
+
+Three phases of `--phase-seconds` each: baseline, attack, baseline again. The attackers rotate random emails
+(and X-Forwarded-For, which only matters with RATE_LIMIT_TRUST_FORWARDED=True) at `--attackers` concurrency.
+With the limiter on, the legit p50/p95 should stay close to the baseline while most attack requests get 429s.
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+import httpx
+from benchmarks.results import percentile
+
+
+async def legit_client(client, args, stop, latencies, statuses):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/auth/login", json={"email": args.email, "password": args.password},
+                                     headers={"X-Forwarded-For": "10.0.0.1"})
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+        await asyncio.sleep(args.legit_interval)
+
+
+async def attacker(client, stop, statuses):
+    while not stop.is_set():
+        email = f"victim{random.randrange(10 ** 6)}@example.com"
+        ip = f"203.0.{random.randrange(256)}.{random.randrange(256)}"
+        try:
+            response = await client.post("/auth/login", json={"email": email, "password": "hunter2"},
+                                         headers={"X-Forwarded-For": ip})
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+
+async def phase(name, args, attack: bool):
+    stop = asyncio.Event()
+    latencies, legit_statuses, attack_statuses = [], Counter(), Counter()
+    limits = httpx.Limits(max_connections=args.attackers + 4)
+    async with httpx.AsyncClient(base_url=args.url, timeout=30, limits=limits) as client:
+        tasks = [asyncio.create_task(legit_client(client, args, stop, latencies, legit_statuses))]
+        if attack:
+            tasks += [asyncio.create_task(attacker(client, stop, attack_statuses)) for _ in range(args.attackers)]
+        await asyncio.sleep(args.phase_seconds)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"{name:<10} legit n={len(latencies):<5} p50={percentile(latencies, 0.5) * 1000:7.1f}ms "
+          f"p95={percentile(latencies, 0.95) * 1000:7.1f}ms "
+          f"mean={statistics.fmean(latencies) * 1000 if latencies else 0:7.1f}ms statuses={dict(legit_statuses)}")
+    if attack:
+        total = sum(attack_statuses.values())
+        print(f"{'':<10} attack n={total} ({total / args.phase_seconds:.0f}/s) statuses={dict(attack_statuses)}")
+
+
+async def main(args):
+    await phase("baseline", args, attack=False)
+    await phase("attack", args, attack=True)
+    await phase("recovery", args, attack=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--attackers", type=int, default=200)
+    parser.add_argument("--phase-seconds", type=float, default=20)
+    parser.add_argument("--legit-interval", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
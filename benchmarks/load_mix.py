@@ -0,0 +1,203 @@
+"""
+Throughput and p50/p95/p99 latency of the service under realistic request mixes.
+
+Against a running server (with the login rate limits lifted, the whole run comes from one IP):
+    python -m benchmarks.load_mix --url http://127.0.0.1:8000 --mix read-heavy
+Or let it start `python -m app.server` itself against the database from .env, e.g. the fixture in
+benchmarks/docker-compose.yml (`docker compose -f benchmarks/docker-compose.yml up -d`, then `python -m app.cli init-db`):
+    python -m benchmarks.load_mix --spawn --workers 4 --mix balanced --duration 30
+
+Mixes are named (see MIXES) or given inline as weights: --mix register=1,login=2,refresh=2,me=15
+Every client coroutine owns its own test users, so rotating refresh tokens never race each other.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import Counter, defaultdict
+import httpx
+from benchmarks.results import summarize, save_results, print_table
+
+MIXES = {
+    "read-heavy": {"me": 80, "refresh": 10, "login": 8, "register": 2},
+    "balanced": {"me": 50, "refresh": 20, "login": 20, "register": 10},
+    "login-heavy": {"login": 70, "me": 20, "refresh": 10},
+    "signup": {"register": 80, "login": 20},
+}
+
+PASSWORD = "bench-password-123"
+
+
+def parse_mix(value: str) -> dict:
+    if value in MIXES:
+        return MIXES[value]
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("register", "login", "refresh", "me"):
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class BenchUser:
+    def __init__(self, email: str):
+        self.email = email
+        self.access_token = None
+        self.refresh_token = None
+
+    def set_tokens(self, tokens: dict):
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens["refresh_token"]
+
+
+async def register(client, email: str):
+    return await client.post("/users", json={"email": email, "first_name": "Bench", "last_name": "User",
+                                             "password": PASSWORD})
+
+
+async def login(client, user: BenchUser):
+    response = await client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+    if response.status_code == 200:
+        user.set_tokens(response.json())
+    return response
+
+
+async def refresh(client, user: BenchUser):
+    response = await client.post("/auth/refresh", json={"refresh_token": user.refresh_token})
+    if response.status_code == 200:
+        user.set_tokens(response.json())
+    return response
+
+
+async def me(client, user: BenchUser):
+    return await client.get("/users", headers={"Authorization": f"Bearer {user.access_token}"})
+
+
+async def setup_users(client, run_id: str, count: int):
+    users = [BenchUser(f"bench-{run_id}-{i}@example.com") for i in range(count)]
+    semaphore = asyncio.Semaphore(16)
+
+    async def prepare(user):
+        async with semaphore:
+            response = await register(client, user.email)
+            if response.status_code != 200:
+                raise RuntimeError(f"Registering {user.email} failed: {response.status_code} {response.text}")
+            response = await login(client, user)
+            if response.status_code != 200:
+                raise RuntimeError(f"Logging in {user.email} failed: {response.status_code} {response.text}")
+
+    await asyncio.gather(*(prepare(user) for user in users))
+    return users
+
+
+async def client_loop(client, users, mix, run_id, stop, latencies, statuses):
+    operations, weights = zip(*mix.items())
+    user_index = 0
+    while not stop.is_set():
+        operation = random.choices(operations, weights)[0]
+        user = users[user_index % len(users)]
+        user_index += 1
+        start = time.perf_counter()
+        try:
+            if operation == "register":
+                response = await register(client, f"bench-{run_id}-{uuid.uuid4().hex}@example.com")
+            elif operation == "login":
+                response = await login(client, user)
+            elif operation == "refresh":
+                response = await refresh(client, user)
+            else:
+                response = await me(client, user)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            status_code = "error"
+        elapsed = time.perf_counter() - start
+        statuses[operation][status_code] += 1
+        if status_code == 200:
+            latencies[operation].append(elapsed)
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        users = await setup_users(client, run_id, args.concurrency * args.users_per_client)
+        slices = [users[i::args.concurrency] for i in range(args.concurrency)]
+
+        for phase, seconds in (("warmup", args.warmup), ("measure", args.duration)):
+            stop = asyncio.Event()
+            latencies, statuses = defaultdict(list), defaultdict(Counter)
+            tasks = [asyncio.create_task(client_loop(client, slices[i], mix, run_id, stop, latencies, statuses))
+                     for i in range(args.concurrency)]
+            started = time.perf_counter()
+            await asyncio.sleep(seconds)
+            stop.set()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+    results = {}
+    for operation in mix:
+        results[operation] = summarize(latencies[operation], elapsed)
+        results[operation]["statuses"] = {str(code): count for code, count in statuses[operation].items()}
+    results["total"] = summarize([value for values in latencies.values() for value in values], elapsed)
+    results["total"]["failed"] = sum(count for counter in statuses.values()
+                                     for code, count in counter.items() if code != 200)
+    return results
+
+
+def spawn_server(args):
+    env = dict(os.environ)
+    # One client IP drives the whole run, lift the login limits unless the caller set them explicitly
+    for name in ("LOGIN_RATE_LIMIT_PER_IP", "LOGIN_RATE_LIMIT_PER_EMAIL", "LOGIN_RATE_LIMIT_GLOBAL"):
+        env.setdefault(name, "0")
+    port = httpx.URL(args.url).port or 8000
+    process = subprocess.Popen([sys.executable, "-m", "app.server", "--port", str(port),
+                                "--workers", str(args.workers)], env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if httpx.get(f"{args.url}/health/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready within 60s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_mix")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", default="balanced", help=f"{', '.join(MIXES)} or op=weight,...")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--users-per-client", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before")
+    parser.add_argument("--spawn", action="store_true", help="Start python -m app.server for the run")
+    parser.add_argument("--workers", type=int, default=0, help="Server workers with --spawn, 0 = one per CPU")
+    parser.add_argument("--output", help="JSON file, defaults to benchmarks/results/load-<mix>-<commit>.json")
+    args = parser.parse_args(argv)
+
+    process = spawn_server(args) if args.spawn else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_table(results)
+    suite = f"load-{args.mix}" if args.mix in MIXES else "load-custom"
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "spawn")}
+    save_results(suite, results, args.output, params=params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Micro-benchmarks of the hot auth functions, no database or network needed.
+
+Run from the repo root (signing keys are generated when PRIVATE_KEY/PUBLIC_KEY aren't set):
+    python -m benchmarks.micro [--seconds 2] [--output results.json]
+
+get_current_user resolves the principal from a verified token and reads the user record from a warm
+user cache, the database path is measured by the load mixes in benchmarks.load_mix.
+"""
+import os
+import time
+import uuid
+import asyncio
+import argparse
+from benchmarks.results import summarize, save_results, print_table
+
+
+def ensure_keys():
+    # Not benchmarks.bench_tokens.generate_keys, importing that module loads the app config before the keys are set
+    if os.getenv("PRIVATE_KEY"):
+        return
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ["PRIVATE_KEY"] = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                  serialization.NoEncryption()).decode()
+    os.environ["PUBLIC_KEY"] = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                             serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+
+def measure(func, seconds: float, min_count: int = 5):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(latencies) < min_count:
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+async def measure_async(func, seconds: float, min_count: int = 5):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(latencies) < min_count:
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+async def run(seconds: float) -> dict:
+    # Imported here, the app config reads the keys at import time
+    from app.models import AuthProviderEnum
+    from app.utlis.security import (create_access_token,
+                                    decode_access_token,
+                                    generate_hashed_password,
+                                    verify_password,
+                                    verify_token)
+    from app.utlis.token_cache import token_cache
+    from app.utlis.user_cache import user_cache, UserRecord
+    from app.utlis.users_processing import get_current_principal
+    from app.utlis.hashing import setup_password_hashing
+    from app.utlis.introspection import token_introspector
+
+    setup_password_hashing()  # Same cost the service would run with
+
+    user_uuid = str(uuid.uuid4())
+    email = "bench@example.com"
+    token = create_access_token(email, user_uuid, is_active=True)
+    hashed = await generate_hashed_password("correct horse battery staple")
+    await user_cache.set(UserRecord(uuid.UUID(user_uuid), email, True, hashed, "Bench", "User",
+                                    AuthProviderEnum.EMAIL))
+    header = f"Bearer {token}"
+
+    def verify_cold():
+        token_cache.clear()
+        return verify_token(header)
+
+    batch = [create_access_token(f"bench{i}@example.com", str(uuid.uuid4())) for i in range(100)]
+
+    def introspect_cold():
+        token_cache.clear()
+        return token_introspector.introspect(batch)
+
+    async def current_user():
+        payload = await verify_token(header)
+        # Both sessions passed explicitly, outside a request the Depends defaults would stand in for them.
+        # The record is cached, a miss would fail on the None session instead of hiding a query in the timing
+        principal = await get_current_principal(payload, db=None, read_db=None)
+        return await principal.get_record()
+
+    results = {
+        "create_access_token": measure(lambda: create_access_token(email, user_uuid, is_active=True), seconds),
+        "decode_access_token": measure(lambda: decode_access_token(token), seconds),
+        "verify_token (cold cache)": await measure_async(verify_cold, seconds),
+        "verify_token (warm cache)": await measure_async(lambda: verify_token(header), seconds),
+        "verify_password": await measure_async(
+            lambda: verify_password("correct horse battery staple", hashed), seconds),
+        "get_current_user (cached record)": await measure_async(current_user, seconds),
+        "introspect 100 tokens (cold cache)": await measure_async(introspect_cold, seconds),
+        "introspect 100 tokens (warm cache)": await measure_async(lambda: token_introspector.introspect(batch), seconds),
+    }
+    token_introspector.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Per benchmark")
+    parser.add_argument("--output", help="JSON file, defaults to benchmarks/results/micro-<commit>.json")
+    args = parser.parse_args(argv)
+
+    ensure_keys()
+    results = asyncio.run(run(args.seconds))
+    print_table(results)
+    save_results("micro", results, args.output, params={"seconds": args.seconds})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Shared latency statistics and JSON result files, so runs can be compared between commits:
+    python -m benchmarks.compare benchmarks/results/micro-<old>.json benchmarks/results/micro-<new>.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summarize(latencies, elapsed: float = None) -> dict:
+    """Latencies in seconds -> milliseconds percentiles, throughput over `elapsed` (or the summed latencies)"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    return {
+        "count": count,
+        "throughput_per_second": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 4) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4) if count else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(suite: str, results: dict, path: str = None, params: dict = None) -> str:
+    commit = git_commit()
+    document = {
+        "suite": suite,
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()} {os.cpu_count()} cpus",
+        "params": params or {},
+        "results": results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{suite}-{commit}.json")
+    with open(path, "w") as file:
+        json.dump(document, file, indent=2)
+    print(f"Results written to {path}", file=sys.stderr)
+    return path
+
+
+def print_table(results: dict):
+    print(f"{'benchmark':<34} {'count':>8} {'ops/s':>11} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<34} {stats['count']:>8} {stats['throughput_per_second']:>11.1f} "
+              f"{stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f}")
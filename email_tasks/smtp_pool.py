@@ -0,0 +1,143 @@
+import time
+import queue
+import threading
+from smtplib import (SMTP,
+                     SMTPException,
+                     SMTPServerDisconnected,
+                     SMTPRecipientsRefused,
+                     SMTPSenderRefused,
+                     SMTPDataError)
+from app.config import logger
+
+
+class PooledConnection:
+    def __init__(self, smtp: SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP connections open between tasks of a worker process.
+    Connections idle longer than `noop_after` are probed with NOOP before use and replaced when stale,
+    those idle longer than `max_idle` or past `max_messages` are recycled without asking.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, size=2,
+                 max_idle=240, noop_after=30, max_messages=500, timeout=30):
+        self.host = host
+        self.port = int(port) if port else 0
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_idle = max_idle
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self) -> PooledConnection:
+        smtp = SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return PooledConnection(smtp)
+
+    def _is_usable(self, conn: PooledConnection) -> bool:
+        idle = time.monotonic() - conn.last_used
+        if idle > self.max_idle or conn.messages_sent >= self.max_messages:
+            return False
+        if idle > self.noop_after:
+            try:
+                return conn.smtp.noop()[0] == 250
+            except (SMTPException, OSError):
+                return False
+        return True
+
+    def acquire(self) -> PooledConnection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._is_usable(conn):
+                return conn
+            conn.close()
+
+    def release(self, conn: PooledConnection):
+        conn.last_used = time.monotonic()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def send(self, from_addr: str, to_addr: str, message: str):
+        failures = self.send_many([(from_addr, to_addr, message)])
+        if failures:
+            raise failures[to_addr]
+
+    def send_many(self, messages, throttle=None):
+        """
+        Sends (from, to, message) tuples over one connection, reconnecting if the server dropped it.
+        `throttle` is called before every message, e.g. a rate limiter that sleeps.
+        Returns {to_addr: exception} for the messages that failed.
+        """
+        failures = {}
+        conn = None
+        try:
+            for from_addr, to_addr, message in messages:
+                if throttle is not None:
+                    throttle()
+                try:
+                    if conn is None:
+                        conn = self.acquire()
+                    try:
+                        conn.smtp.sendmail(from_addr, to_addr, message)
+                    except SMTPServerDisconnected:
+                        conn.close()
+                        conn = self._connect()
+                        conn.smtp.sendmail(from_addr, to_addr, message)
+                    conn.messages_sent += 1
+                except (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError) as e:
+                    # Rejected message, smtplib has reset the session and the connection stays usable
+                    logger.error("Error sending email to %s: %s", to_addr, e)
+                    failures[to_addr] = e
+                except (SMTPException, OSError) as e:
+                    logger.error("Error sending email to %s: %s", to_addr, e)
+                    failures[to_addr] = e
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            raise
+
+        if conn is not None:
+            self.release(conn)
+        return failures
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -1,49 +1,193 @@
 import os
-from smtplib import SMTP
+import time
+from functools import lru_cache
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery.worker.control import inspect_command
 from app.config import (SMTP_SERVER,
                         SMTP_PORT,
                         SMTP_FROM,
                         SMTP_USERNAME,
                         SMTP_PASSWORD,
+                        SMTP_USE_TLS,
+                        SMTP_POOL_SIZE,
+                        SMTP_MAX_IDLE_SECONDS,
+                        SMTP_MAX_MESSAGES_PER_CONNECTION,
+                        EMAIL_RATE_LIMIT_PER_SECOND,
+                        EMAIL_RATE_LIMIT_BACKEND,
+                        EMAIL_RATE_LIMIT_REDIS_URL,
+                        EMAIL_MAX_RETRIES,
+                        EMAIL_RETRY_BACKOFF_SECONDS,
                         SERVER,
                         SERVER_PORT,
-                        DEBUG)
+                        DEBUG,
+                        logger)
 from app.celery import celery
+from email_tasks.smtp_pool import SMTPConnectionPool
+from email_tasks.throttle import TokenBucket, RedisTokenBucket
 
 TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "email_templates/confirmation.html")
+EMAIL_SUBJECT_CONFIRMATION = "Confirm your email at Plattr"
 
+_smtp_pool = None
+_rate_limiters = {}
+
+# Cumulative per worker process, read with `celery -A app.celery inspect email_metrics`
+email_metrics = {
+    "batches": 0,
+    "sent": 0,
+    "failed": 0,
+    "render_failed": 0,
+    "retried": 0,
+    "dropped": 0,
+    "batch_seconds_total": 0.0,
+    "latency_seconds_total": 0.0,  # Enqueued in the API -> handed to SMTP
+    "latency_seconds_max": 0.0,
+}
+
+
+"""
+# Per worker process state
+"""
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPConnectionPool(
+            SMTP_SERVER,
+            SMTP_PORT,
+            username=SMTP_USERNAME,
+            password=SMTP_PASSWORD,
+            use_tls=SMTP_USE_TLS,
+            size=SMTP_POOL_SIZE,
+            max_idle=SMTP_MAX_IDLE_SECONDS,
+            max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION
+        )
+    return _smtp_pool
+
+
+@worker_process_init.connect
+def reset_smtp_pool(**kwargs):
+    # Sockets must not be shared with the parent after a prefork
+    global _smtp_pool
+    _smtp_pool = None
+    _rate_limiters.clear()
 
-@celery.task
-def send_confirmation_email(to_email, token):
-    """Send the email confirmation with a token."""
-    EMAIL_SUBJECT_CONFIRMATION = "Confirm your email at Plattr"
 
+def get_rate_limiter(provider: str):
+    """EMAIL_RATE_LIMIT_PER_SECOND for the provider across all workers, or per worker process with the memory backend"""
+    if provider not in _rate_limiters:
+        if EMAIL_RATE_LIMIT_BACKEND == "redis":
+            _rate_limiters[provider] = RedisTokenBucket(EMAIL_RATE_LIMIT_REDIS_URL, f"email:ratelimit:{provider}",
+                                                        EMAIL_RATE_LIMIT_PER_SECOND)
+        else:
+            _rate_limiters[provider] = TokenBucket(EMAIL_RATE_LIMIT_PER_SECOND)
+    return _rate_limiters[provider]
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**kwargs):
+    if _smtp_pool is not None:
+        _smtp_pool.close()
+
+
+@lru_cache(maxsize=None)
+def load_confirmation_template():
+    """Reads the template once per process and splits it around the placeholder"""
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as file:
+        html_template = file.read()
+    head, _, tail = html_template.partition("{{ confirmation_link }}")
+    return head, tail
+
+
+def build_confirmation_message(to_email, token) -> str:
     if DEBUG:
-        confirmation_link = f"http://{SERVER}:{SERVER_PORT}/auth/confirm/{token}"
+        confirmation_link = f"http://{SERVER}:{SERVER_PORT}/users/confirm/{token}"
     else:
-        confirmation_link = f"https://{SERVER}:{SERVER_PORT}/auth/confirm/{token}"
-
-    try:
-        with open(TEMPLATE_PATH, "r", encoding="utf-8") as file:
-            html_template = file.read()
-    except Exception as e:
-        print(f"Error loading email template: {e}")
-        return
+        confirmation_link = f"https://{SERVER}:{SERVER_PORT}/users/confirm/{token}"
 
-    html_content = html_template.replace("{{ confirmation_link }}", confirmation_link)
+    head, tail = load_confirmation_template()
 
     msg = MIMEMultipart()
     msg["From"] = SMTP_FROM
     msg["To"] = to_email
     msg["Subject"] = EMAIL_SUBJECT_CONFIRMATION
-    msg.attach(MIMEText(html_content, "html"))  # Attach HTML content
+    msg.attach(MIMEText(head + confirmation_link + tail, "html"))  # Attach HTML content
+    return msg.as_string()
+
 
+@celery.task
+def send_confirmation_email(to_email, token):
+    """Send the email confirmation with a token."""
     try:
-        with SMTP(SMTP_SERVER, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
-            smtp.sendmail(SMTP_FROM, to_email, msg.as_string())
-    except Exception as e:
-        print(f"Error sending email: {e}")
\ No newline at end of file
+        message = build_confirmation_message(to_email, token)
+    except Exception:
+        logger.exception("Rendering the confirmation email to %s failed", to_email)
+        return
+
+    try:
+        get_smtp_pool().send(SMTP_FROM, to_email, message)
+    except Exception:
+        logger.exception("Sending the confirmation email to %s failed", to_email)
+
+
+@celery.task
+def send_confirmation_emails(batch):
+    """
+    Sends a batch of {"to", "token", "enqueued_at", "attempt"} over one pooled SMTP session, paced by the
+    provider rate limit. Failed recipients, whether rendering or sending failed, are re-queued individually
+    with exponential backoff.
+    """
+    start = time.time()
+    messages = []
+    render_failures = {}
+    for item in batch:
+        try:
+            messages.append((SMTP_FROM, item["to"], build_confirmation_message(item["to"], item["token"])))
+        except Exception as e:
+            logger.exception("Rendering the confirmation email to %s failed", item["to"])
+            render_failures[item["to"]] = e
+
+    failures = get_smtp_pool().send_many(messages, throttle=get_rate_limiter(SMTP_SERVER).acquire) if messages else {}
+    failures.update(render_failures)
+
+    retry = []
+    for item in batch:
+        if item["to"] not in failures:
+            latency = start - item.get("enqueued_at", start)
+            email_metrics["latency_seconds_total"] += latency
+            email_metrics["latency_seconds_max"] = max(email_metrics["latency_seconds_max"], latency)
+            continue
+        if item.get("attempt", 0) < EMAIL_MAX_RETRIES:
+            retry.append(item)
+        else:
+            email_metrics["dropped"] += 1
+            logger.error("Giving up on confirmation email to %s after %d retries", item["to"], item.get("attempt", 0))
+
+    for item in retry:
+        attempt = item.get("attempt", 0) + 1
+        send_confirmation_emails.apply_async(
+            args=[[{**item, "attempt": attempt}]],
+            countdown=EMAIL_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        )
+
+    elapsed = time.time() - start
+    email_metrics["batches"] += 1
+    email_metrics["sent"] += len(batch) - len(failures)
+    email_metrics["failed"] += len(failures)
+    email_metrics["render_failed"] += len(render_failures)
+    email_metrics["retried"] += len(retry)
+    email_metrics["batch_seconds_total"] += elapsed
+    logger.info("Confirmation batch: %d/%d sent in %.3fs, %d queued for retry",
+                len(batch) - len(failures), len(batch), elapsed, len(retry))
+
+
+@inspect_command(name="email_metrics")
+def email_metrics_command(state):
+    sent = email_metrics["sent"]
+    return {
+        **email_metrics,
+        "latency_seconds_avg": email_metrics["latency_seconds_total"] / sent if sent else 0.0,
+        "throughput_per_second": sent / email_metrics["batch_seconds_total"] if email_metrics["batch_seconds_total"] else 0.0,
+    }
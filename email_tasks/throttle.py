@@ -0,0 +1,87 @@
+import time
+import threading
+from app.config import logger
+
+
+class TokenBucket:
+    """Blocking token bucket, `rate` sends per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+REDIS_RETRY_SECONDS = 30  # Local limiting after a Redis error, before trying it again
+
+# Refills and takes one token in a single step, on the Redis clock so workers on other hosts agree.
+# Returns 0 when a token was taken, otherwise the seconds until one is due (as a string, Lua numbers are truncated)
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    TokenBucket kept in Redis, shared by every worker process sending through the same provider.
+    While Redis is unreachable it falls back to a local bucket at the same rate instead of failing the batch.
+    """
+
+    def __init__(self, url: str, key: str, rate: float, capacity: float = None):
+        import redis
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.key = key
+        self._errors = (redis.RedisError, OSError)
+        self._take = redis.from_url(url, socket_timeout=1, socket_connect_timeout=1).register_script(TAKE_SCRIPT)
+        self._fallback = TokenBucket(rate, self.capacity)
+        self._retry_at = 0.0
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            if time.monotonic() < self._retry_at:
+                return self._fallback.acquire()
+            try:
+                wait = float(self._take(keys=[self.key], args=[self.rate, self.capacity]))
+            except self._errors as e:
+                logger.warning("Shared email rate limit unavailable, limiting this worker only for %ds: %s",
+                               REDIS_RETRY_SECONDS, e)
+                self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+                return self._fallback.acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
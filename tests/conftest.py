@@ -0,0 +1,26 @@
+import os
+import asyncio
+import pytest
+
+
+def _generate_keys():
+    # Before anything imports app.config, which reads the signing keys at import time
+    if os.getenv("PRIVATE_KEY"):
+        return
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ["PRIVATE_KEY"] = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                  serialization.NoEncryption()).decode()
+    os.environ["PUBLIC_KEY"] = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                             serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+
+_generate_keys()
+os.environ.setdefault("HASH_ROUNDS", "4")  # Cheapest bcrypt cost, the tests check behaviour, not strength
+
+
+@pytest.fixture
+def run():
+    """Runs a coroutine to completion, the suite has no async plugin"""
+    return asyncio.run
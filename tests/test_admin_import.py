@@ -0,0 +1,79 @@
+import json
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routes import admin
+
+
+async def fake_import_users(rows):
+    """Reports every parsed row without a database"""
+    async for line_number, row in rows:
+        yield {"line": line_number, "email": row.get("email") if isinstance(row, dict) else None,
+               "status": "created" if isinstance(row, dict) else "error"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", "admin-key")
+    monkeypatch.setattr(admin, "import_users", fake_import_users)
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/admin")
+    return TestClient(app)
+
+
+async def post_import(app, chunks):
+    """
+    Drives the ASGI app like a server would: the body arrives in `chunks`, after that receive() only returns
+    once the client disconnects, which it doesn't before the response is complete
+    """
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    done = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": "/admin/users/import", "raw_path": b"/admin/users/import", "query_string": b"",
+             "root_path": "", "headers": [(b"x-admin-key", b"admin-key")], "client": ("127.0.0.1", 5000),
+             "server": ("testserver", 80)}
+    await asyncio.wait_for(app(scope, receive, send), 30)
+    status = next(message["status"] for message in sent if message["type"] == "http.response.start")
+    return status, b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+
+
+def test_every_row_of_a_large_body_gets_a_result(run, client):
+    rows = 20000
+    chunks = ["".join(json.dumps({"email": f"user{i}@example.com", "password": "x"}) + "\n"
+                      for i in range(start, start + 500)).encode() for start in range(0, rows, 500)]
+
+    status, body = run(post_import(client.app, chunks))
+    assert status == 200
+    results = [json.loads(line) for line in body.decode().splitlines()]
+    assert len(results) == rows
+    assert results[-1] == {"line": rows, "email": f"user{rows - 1}@example.com", "status": "created"}
+
+
+def test_csv_body(client):
+    body = "email,first_name,last_name,password\na@example.com,A,B,x\nb@example.com,C,D,y\n"
+    response = client.post("/admin/users/import?format=csv", data=body, headers={"X-Admin-Key": "admin-key"})
+    assert [json.loads(line)["email"] for line in response.text.splitlines()] == ["a@example.com", "b@example.com"]
+
+
+def test_admin_key_and_format_are_checked(client, monkeypatch):
+    assert client.post("/admin/users/import", data="").status_code == 401
+    assert client.post("/admin/users/import", data="", headers={"X-Admin-Key": "wrong"}).status_code == 401
+    assert client.post("/admin/users/import?format=xml", data="",
+                       headers={"X-Admin-Key": "admin-key"}).status_code == 400
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", None)
+    assert client.post("/admin/users/import", data="", headers={"X-Admin-Key": "admin-key"}).status_code == 403
@@ -0,0 +1,109 @@
+import uuid
+import threading
+import pytest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from authclient import JWKSClient, StaticKeys, TokenVerifier, InvalidTokenError, ExpiredTokenError, \
+    KeyNotFoundError
+from app.config import PUBLIC_KEY
+from app.utlis.tokens import get_token_service
+from app.utlis.security import create_access_token, create_refresh_token
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    """Serves the auth service's key set the way /.well-known/jwks.json does"""
+    requests = []
+
+    def do_GET(self):
+        body, etag = get_token_service().jwks()
+        JWKSHandler.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def jwks_url():
+    JWKSHandler.requests = []
+    server = HTTPServer(("127.0.0.1", 0), JWKSHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/.well-known/jwks.json"
+    server.shutdown()
+    server.server_close()
+
+
+def access_token():
+    return create_access_token("a@example.com", str(uuid.uuid4()), is_active=True)
+
+
+def test_refresh_sends_the_etag_back(jwks_url):
+    client = JWKSClient(jwks_url, background=False)
+    client.refresh()
+    client.refresh()
+    etag = get_token_service().jwks()[1]
+    assert JWKSHandler.requests == [None, etag]  # The second one was answered with a 304
+    assert client.get_key(get_token_service().kid) is not None
+
+
+def test_unknown_kid_refreshes_at_most_once_per_interval(jwks_url):
+    client = JWKSClient(jwks_url, background=False, min_refresh_interval=60)
+    assert client.get_key(get_token_service().kid) is not None  # First miss fetches
+    for _ in range(3):
+        with pytest.raises(KeyNotFoundError):
+            client.get_key("retired-long-ago")
+    assert len(JWKSHandler.requests) == 1
+
+
+def test_async_key_refresh_runs_off_the_event_loop(run, jwks_url):
+    client = JWKSClient(jwks_url, background=False)
+    threads = []
+    refresh = client.refresh
+    client.refresh = lambda: (threads.append(threading.current_thread()), refresh())
+    verifier = TokenVerifier(client)
+    assert run(verifier.verify_authorization_async(f"Bearer {access_token()}"))["email"] == "a@example.com"
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_background_client_serves_the_first_request(jwks_url):
+    client = JWKSClient(jwks_url)
+    try:
+        assert TokenVerifier(client).verify(access_token())["typ"] == "access"
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def verifier():
+    return TokenVerifier(StaticKeys(PUBLIC_KEY, kid=get_token_service().kid))
+
+
+def test_verifier_caches_verified_claims(verifier):
+    token = access_token()
+    assert verifier.verify(token) is verifier.verify(token)
+    assert (verifier.cache.misses, verifier.cache.hits) == (1, 1)
+
+
+def test_verifier_rejects_refresh_tokens(verifier):
+    with pytest.raises(InvalidTokenError, match="token type"):
+        verifier.verify(create_refresh_token("a@example.com", str(uuid.uuid4())))
+
+
+def test_verifier_rejects_expired_and_malformed(verifier):
+    expired = get_token_service().sign({"typ": "access", "uuid": "u", "exp": 1})
+    with pytest.raises(ExpiredTokenError):
+        verifier.verify(expired)
+    with pytest.raises(InvalidTokenError):
+        verifier.verify("not-a-token")
+    with pytest.raises(InvalidTokenError):
+        verifier.verify_authorization("Basic abc")
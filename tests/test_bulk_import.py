@@ -0,0 +1,49 @@
+from passlib.context import CryptContext
+from app.utlis.bulk_import import iter_lines, iter_rows, validate_row
+
+BCRYPT = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_lines_split_across_chunks(run):
+    lines = run(_collect(iter_lines(_chunks(b'{"a": 1}\n{"b"', b': 2}\r\n', b'{"c": 3}'))))
+    assert lines == ['{"a": 1}', '{"b": 2}', '{"c": 3}']
+
+
+def test_csv_rows_keep_line_numbers(run):
+    lines = _chunks(b"email,first_name\n", b"a@example.com,Ann\n\n", b"b@example.com,Bob\n")
+    rows = run(_collect(iter_rows(iter_lines(lines), "csv")))
+    assert rows == [(2, {"email": "a@example.com", "first_name": "Ann"}),
+                    (4, {"email": "b@example.com", "first_name": "Bob"})]
+
+
+def test_ndjson_rejects_non_objects(run):
+    rows = run(_collect(iter_rows(iter_lines(_chunks(b'[1, 2]\n{"email": "a@example.com"}\n')))))
+    assert rows[0] == (1, "Unparsable row: Expected a JSON object")
+    assert rows[1] == (2, {"email": "a@example.com"})
+
+
+def test_validate_row_requires_one_password_field():
+    assert validate_row({"password": "x"}) == "Missing email"
+    assert validate_row({"email": "a@example.com"}) is not None
+    assert validate_row({"email": "a@example.com", "password": "x", "hashed_password": BCRYPT.hash("x")}) is not None
+    assert validate_row({"email": "a@example.com", "password": "x"}) is None
+
+
+def test_validate_row_accepts_bcrypt_hash():
+    assert validate_row({"email": "a@example.com", "hashed_password": BCRYPT.hash("secret")}) is None
+
+
+def test_validate_row_rejects_non_bcrypt_hash():
+    for value in ("plaintext", "$2b$12$tooshort", "$1$abc$" + "a" * 22, BCRYPT.hash("x")[:-1], 12345,
+                  CryptContext(schemes=["sha256_crypt"]).hash("x")):
+        assert validate_row({"email": "a@example.com", "hashed_password": value}) == \
+            "hashed_password is not a bcrypt hash", value
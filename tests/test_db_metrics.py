@@ -0,0 +1,43 @@
+import time
+import pytest
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app.database import _instrument
+
+
+def sample(name):
+    return REGISTRY.get_sample_value(name, {"stage": "db_query"}) or 0.0
+
+
+@pytest.fixture
+def engine():
+    # _instrument only needs .sync_engine, a stdlib sqlite engine stands in for the async one
+    engine = create_engine("sqlite://")
+    _instrument(SimpleNamespace(sync_engine=engine))
+    yield engine
+    engine.dispose()
+
+
+def test_statements_are_timed(engine):
+    count = sample("auth_stage_duration_seconds_count")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    assert sample("auth_stage_duration_seconds_count") == count + 2
+
+
+def test_failed_statement_is_counted_and_leaves_nothing_behind(engine):
+    count, errors = sample("auth_stage_duration_seconds_count"), sample("auth_stage_errors_total")
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+        assert "query_start" not in conn.info
+        time.sleep(0.05)
+        total = sample("auth_stage_duration_seconds_sum")
+        conn.execute(text("SELECT 1"))
+    assert sample("auth_stage_errors_total") == errors + 3
+    assert sample("auth_stage_duration_seconds_count") == count + 1
+    assert sample("auth_stage_duration_seconds_sum") - total < 0.05  # Timed from its own start
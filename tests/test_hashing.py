@@ -0,0 +1,15 @@
+from passlib.context import CryptContext
+from app.utlis.hashing import pwd_context, configure_rounds
+
+
+def test_cheaper_hash_needs_update():
+    configure_rounds(10)
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password")
+    assert pwd_context.needs_update(old_hash)
+
+
+def test_more_expensive_hash_is_not_downgraded():
+    configure_rounds(10)
+    strong_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=12).hash("password")
+    assert not pwd_context.needs_update(strong_hash)
+    assert pwd_context.verify("password", strong_hash)
@@ -0,0 +1,65 @@
+import time
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app.routes import well_known
+from app.routes.well_known import etag_matches
+from app.utlis.tokens import TokenService, get_token_service
+
+
+def key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+    public = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                           serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private, public
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(well_known.router, prefix="/.well-known")
+    return TestClient(app)
+
+
+def test_jwks_is_cacheable(client):
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert response.headers["etag"] == get_token_service().jwks()[1]
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert [key["kid"] for key in response.json()["keys"]] == [get_token_service().kid]
+
+
+def test_matching_etag_gets_a_304(client):
+    etag = client.get("/.well-known/jwks.json").headers["etag"]
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get("/.well-known/jwks.json", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == etag
+    assert client.get("/.well-known/jwks.json", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_matches():
+    assert etag_matches('W/"abc"', '"abc"')  # Proxies that compress weaken the ETag
+    assert etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"') and not etag_matches("", '"abc"')
+
+
+def test_key_rotation():
+    (old_private, old_public), new = key_pair(), key_pair()
+    old = TokenService(old_private, old_public)
+    rotated = TokenService(*new, extra_public_keys={old.kid: old_public})
+    token = old.sign({"uuid": "u", "exp": time.time() + 60})
+    assert rotated.verify(token)["uuid"] == "u"
+    assert jwt.get_unverified_header(rotated.sign({"uuid": "u"}))["kid"] == rotated.kid != old.kid
+    with pytest.raises(jwt.InvalidTokenError, match="Unknown key id"):
+        old.verify(rotated.sign({"uuid": "u"}))
+
+    body, etag = rotated.jwks()
+    assert {old.kid, rotated.kid} == {key.key_id for key in jwt.PyJWKSet.from_json(body.decode()).keys}
+    assert etag != old.jwks()[1] and rotated.jwks() == (body, etag)
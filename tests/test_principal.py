@@ -0,0 +1,63 @@
+import uuid
+import pytest
+from fastapi import HTTPException
+from app.models import User, AuthProviderEnum
+from app.utlis import users_processing
+from app.utlis.user_cache import UserCache, MemoryCacheBackend
+from app.utlis.users_processing import get_current_principal
+
+
+class Session:
+    info = {}
+
+    def __init__(self, user=None):
+        self.user = user
+        self.queries = 0
+
+    async def scalar(self, statement):
+        self.queries += 1
+        return self.user
+
+
+@pytest.fixture
+def user(monkeypatch):
+    monkeypatch.setattr(users_processing, "user_cache", UserCache(MemoryCacheBackend()))
+    return User(uuid=uuid.uuid4(), email="a@example.com", is_active=True, first_name="A", last_name="B",
+                auth_provider=AuthProviderEnum.EMAIL)
+
+
+def claims(user):
+    return {"uuid": str(user.uuid), "email": user.email, "is_active": True, "provider": "email"}
+
+
+def test_claims_need_no_query(run, user):
+    db = Session(user)
+    principal = run(get_current_principal(claims(user), db, db))
+    assert (principal.uuid, principal.email, principal.is_active, principal.provider) == \
+        (str(user.uuid), "a@example.com", True, "email")
+    assert db.queries == 0
+
+
+def test_user_is_loaded_once_from_the_primary(run, user):
+    db, read_db = Session(user), Session(user)
+    principal = run(get_current_principal(claims(user), db, read_db))
+    assert run(principal.get_user()) is run(principal.get_user()) is user
+    assert (db.queries, read_db.queries) == (1, 0)
+
+
+def test_record_is_read_from_the_read_session(run, user):
+    db, read_db = Session(user), Session(user)
+    principal = run(get_current_principal(claims(user), db, read_db))
+    assert run(principal.get_record()).email == "a@example.com"
+    assert (db.queries, read_db.queries) == (0, 1)
+
+
+def test_missing_uuid_or_user(run, user):
+    with pytest.raises(HTTPException) as e:
+        run(get_current_principal({"email": "a@example.com"}, Session(), Session()))
+    assert e.value.status_code == 401
+    principal = run(get_current_principal(claims(user), Session(), Session()))
+    for load in (principal.get_user, principal.get_record):
+        with pytest.raises(HTTPException) as e:
+            run(load())
+        assert e.value.detail == "User not found."
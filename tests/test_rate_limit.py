@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from app.utlis import rate_limit
+from app.utlis.rate_limit import RateLimiter, MemoryRateLimitBackend, parse_limit, client_ip
+
+
+def make_request(forwarded=None, peer="10.0.0.9"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+def test_parse_limit():
+    assert parse_limit("10/60") == (10, 60)
+    assert parse_limit("5") == (5, 60)
+    assert parse_limit("0") is None and parse_limit("") is None
+
+
+def test_sliding_window_counts_the_previous_window(run, monkeypatch):
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    now = [1000.0]  # Start of a 10s window
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    assert [run(limiter.hit("k", 3, 10)) for _ in range(4)] == [0, 0, 0, 10]
+
+    now[0] = 1015.0  # Halfway through the next window, 2 of the 4 previous hits still count
+    assert run(limiter.hit("k", 3, 10)) == 0
+    assert run(limiter.hit("k", 3, 10)) == 5
+
+
+def test_flood_of_new_keys_keeps_the_hot_ones(run):
+    backend = MemoryRateLimitBackend(max_keys=3)
+    run(backend.hit("login:ip:attacker", 60, 0))
+    for i in range(10):
+        run(backend.hit(f"login:email:{i}@example.com", 60, 0))
+        run(backend.hit("login:ip:attacker", 60, 0))
+    assert run(backend.hit("login:ip:attacker", 60, 0)) == (12, 0)
+    assert len(backend._windows) == 3
+
+
+def test_client_ip_ignores_the_header_unless_trusted(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", False)
+    assert client_ip(make_request("1.1.1.1")) == "10.0.0.9"
+
+
+def test_client_ip_takes_the_entry_the_trusted_proxy_wrote(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXY_HOPS", 1)
+    # The client made up the leftmost entry, the proxy appended the address it saw
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7")) == "203.0.113.7"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXY_HOPS", 2)
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7, 10.0.0.2")) == "203.0.113.7"
+    assert client_ip(make_request("203.0.113.7")) == "203.0.113.7"
+
+
+def test_login_limit_per_email(run, monkeypatch):
+    monkeypatch.setattr(rate_limit, "rate_limiter", RateLimiter(MemoryRateLimitBackend()))
+    monkeypatch.setattr(rate_limit, "LOGIN_LIMITS", (("ip", None), ("email", (2, 60)), ("global", None)))
+    request = make_request()
+    run(rate_limit.check_login_rate_limit(request, "A@example.com"))
+    run(rate_limit.check_login_rate_limit(request, "a@example.com"))
+    with pytest.raises(HTTPException) as e:
+        run(rate_limit.check_login_rate_limit(request, "a@example.com"))
+    assert e.value.status_code == 429 and int(e.value.headers["Retry-After"]) >= 1
+    run(rate_limit.check_login_rate_limit(request, "b@example.com"))
@@ -0,0 +1,70 @@
+import time
+import uuid
+import pytest
+from fastapi import HTTPException
+from app.models import AuthProviderEnum
+from app.utlis import auth_processing, users_processing
+from app.utlis.revocation import RevocationStore, MemoryRevocationBackend
+from app.utlis.user_cache import UserCache, UserRecord, MemoryCacheBackend
+from app.utlis.security import create_access_token, create_refresh_token, decode_access_token
+
+
+@pytest.fixture
+def user(run, monkeypatch):
+    """A cached user, refresh never reaches the (absent) database for it"""
+    cache = UserCache(MemoryCacheBackend())
+    monkeypatch.setattr(users_processing, "user_cache", cache)
+    monkeypatch.setattr(auth_processing, "revocation_store", RevocationStore(MemoryRevocationBackend()))
+    record = UserRecord(uuid.uuid4(), "a@example.com", True, None, "A", "B", AuthProviderEnum.EMAIL)
+    run(cache.set(record))
+    return record
+
+
+def refresh(run, token):
+    return run(auth_processing.refresh(token, None))
+
+
+def test_refresh_rotates_the_pair(run, user):
+    old = create_refresh_token(user.email, str(user.uuid), is_active=True)
+    tokens = refresh(run, old)
+    assert decode_access_token(tokens["access_token"])["typ"] == "access"
+    assert refresh(run, tokens["refresh_token"])["refresh_token"]
+
+
+def test_reused_refresh_token_revokes_every_session(run, user):
+    stolen = create_refresh_token(user.email, str(user.uuid), is_active=True)
+    tokens = refresh(run, stolen)
+    time.sleep(0.002)
+    with pytest.raises(HTTPException) as e:
+        refresh(run, stolen)
+    assert e.value.status_code == 401
+    # The pair the first use got is cut off as well
+    with pytest.raises(HTTPException):
+        refresh(run, tokens["refresh_token"])
+    assert run(auth_processing.revocation_store.is_revoked(decode_access_token(tokens["access_token"])))
+
+
+def test_refreshed_tokens_carry_the_current_record(run, user):
+    token = create_refresh_token(user.email, str(user.uuid), is_active=False, provider="google")
+    claims = decode_access_token(refresh(run, token)["access_token"])
+    assert (claims["is_active"], claims["provider"], claims["email"]) == (True, "email", "a@example.com")
+
+
+def test_access_token_is_not_a_refresh_token(run, user):
+    with pytest.raises(HTTPException) as e:
+        refresh(run, create_access_token(user.email, str(user.uuid), is_active=True))
+    assert e.value.status_code == 401
+
+
+class EmptySession:
+    info = {}
+
+    async def scalar(self, statement):
+        return None
+
+
+def test_deleted_user_can_not_refresh(run, user):
+    token = create_refresh_token("gone@example.com", str(uuid.uuid4()))
+    with pytest.raises(HTTPException) as e:
+        run(auth_processing.refresh(token, EmptySession()))
+    assert e.value.detail == "User not found."
@@ -0,0 +1,55 @@
+import time
+import uuid
+from app.utlis import revocation
+from app.utlis.revocation import RevocationStore, MemoryRevocationBackend
+from app.utlis.security import create_access_token, create_refresh_token, decode_access_token
+
+
+def test_revoke_user_cuts_off_earlier_tokens_of_the_same_second(run, monkeypatch):
+    store = RevocationStore(MemoryRevocationBackend())
+    user_uuid = str(uuid.uuid4())
+    second = 1700000000
+    before = {"uuid": user_uuid, "iat": second, "iat_ms": second * 1000 + 200}
+    after = {"uuid": user_uuid, "iat": second, "iat_ms": second * 1000 + 400}
+    monkeypatch.setattr(revocation.time, "time", lambda: second + 0.3)
+
+    run(store.revoke_user(user_uuid))
+
+    assert run(store.is_revoked(before))
+    assert not run(store.is_revoked(after))
+    assert not run(store.is_revoked({"uuid": str(uuid.uuid4()), "iat_ms": second * 1000}))
+
+
+def test_tokens_minted_after_revoke_user_stay_valid(run):
+    store = RevocationStore(MemoryRevocationBackend())
+    user_uuid = str(uuid.uuid4())
+    old = decode_access_token(create_access_token("a@b.c", user_uuid))
+    time.sleep(0.002)
+    run(store.revoke_user(user_uuid))
+    time.sleep(0.002)
+    new = decode_access_token(create_access_token("a@b.c", user_uuid))
+    refresh = decode_access_token(create_refresh_token("a@b.c", user_uuid))
+
+    assert new["iat"] * 1000 <= new["iat_ms"] < (new["iat"] + 1) * 1000
+    assert run(store.is_cut_off(old))
+    assert not run(store.is_cut_off(new))
+    assert not run(store.is_cut_off(refresh))
+
+
+def test_cutoffs_and_tokens_from_before_iat_ms(run):
+    store = RevocationStore(MemoryRevocationBackend())
+    user_uuid = str(uuid.uuid4())
+    run(store.backend.set_cutoff(user_uuid, 1700000000))  # Stored in seconds
+
+    assert run(store.is_cut_off({"uuid": user_uuid, "iat": 1699999999}))
+    assert run(store.is_cut_off({"uuid": user_uuid, "iat": 1699999999, "iat_ms": 1699999999500}))
+    assert not run(store.is_cut_off({"uuid": user_uuid, "iat": 1700000000}))
+
+
+def test_revoked_jti(run):
+    store = RevocationStore(MemoryRevocationBackend())
+    payload = {"uuid": str(uuid.uuid4()), "jti": str(uuid.uuid4()), "exp": time.time() + 60, "iat_ms": 0}
+
+    assert run(store.revoke(payload))
+    assert not run(store.revoke(payload))  # Reuse
+    assert run(store.is_revoked(payload))
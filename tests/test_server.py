@@ -0,0 +1,24 @@
+import pytest
+from app import server
+
+
+def test_auto_workers_fall_back_to_one_with_memory_backends(monkeypatch):
+    monkeypatch.setattr(server, "REVOCATION_BACKEND", "memory")
+    monkeypatch.setattr(server, "RATE_LIMIT_BACKEND", "redis")
+    assert server.resolve_workers(0, 8) == 1
+    server.check_shared_state(1)
+
+
+def test_auto_workers_use_every_cpu_with_shared_backends(monkeypatch):
+    monkeypatch.setattr(server, "REVOCATION_BACKEND", "redis")
+    monkeypatch.setattr(server, "RATE_LIMIT_BACKEND", "redis")
+    assert server.resolve_workers(0, 8) == 8
+    server.check_shared_state(8)
+
+
+def test_explicit_workers_with_memory_backends_refused(monkeypatch):
+    monkeypatch.setattr(server, "REVOCATION_BACKEND", "redis")
+    monkeypatch.setattr(server, "RATE_LIMIT_BACKEND", "memory")
+    assert server.resolve_workers(4, 8) == 4
+    with pytest.raises(SystemExit, match="RATE_LIMIT_BACKEND"):
+        server.check_shared_state(4)
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from app.utlis.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_lookup(run):
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"email": "a@example.com"}
+
+    async def main():
+        return await asyncio.gather(*(flights.do("user:u:1", lookup) for _ in range(50)))
+
+    results = run(main())
+    assert len(calls) == 1 and all(result is results[0] for result in results)
+    assert flights.metrics() == {"in_flight": 0, "leaders": 1, "coalesced": 49, "overflows": 0, "timeouts": 0}
+
+
+def test_waiters_get_the_leaders_exception(run):
+    flights = SingleFlight()
+
+    async def lookup():
+        await asyncio.sleep(0.01)
+        raise OSError("connection reset")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", lookup) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, OSError) for result in run(main()))
+    assert flights.metrics()["in_flight"] == 0
+
+
+def test_overflowing_and_timed_out_waiters_run_their_own_lookup(run):
+    flights = SingleFlight(max_waiters=1, timeout=0.01)
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", lookup) for _ in range(3)))
+
+    run(main())
+    metrics = flights.metrics()
+    assert len(calls) == 3 and (metrics["overflows"], metrics["timeouts"]) == (1, 1)
+
+
+def test_cancelled_leader_hands_over_to_the_waiters(run):
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "loaded"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("k", lookup))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("k", lookup))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert run(main()) == "loaded" and len(calls) == 2
+
+
+def test_forget_starts_a_fresh_lookup_after_a_write(run):
+    flights = SingleFlight()
+    values = iter(("before the write", "after the write"))
+
+    async def lookup():
+        value = next(values)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        first = asyncio.create_task(flights.do("k", lookup))
+        await asyncio.sleep(0)
+        flights.forget("k")
+        return await first, await flights.do("k", lookup)
+
+    assert run(main()) == ("before the write", "after the write")
+
+
+def test_disabled_runs_every_call(run):
+    flights = SingleFlight(enabled=False)
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+
+    async def main():
+        await asyncio.gather(*(flights.do("k", lookup) for _ in range(3)))
+
+    run(main())
+    assert len(calls) == 3 and flights.metrics()["leaders"] == 0
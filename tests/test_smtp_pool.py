@@ -0,0 +1,88 @@
+import pytest
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from email_tasks import smtp_pool
+from email_tasks.smtp_pool import SMTPConnectionPool
+
+
+class FakeSMTP:
+    """Records what it's asked to send, `drop_after` simulates the server closing an idle connection"""
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.drop_after = None
+        FakeSMTP.opened.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return (250, b"OK")
+
+    def sendmail(self, from_addr, to_addr, message):
+        if self.drop_after is not None and len(self.sent) >= self.drop_after:
+            raise SMTPServerDisconnected("Connection unexpectedly closed")
+        if to_addr.startswith("refused"):
+            raise SMTPRecipientsRefused({to_addr: (550, b"No such user")})
+        self.sent.append(to_addr)
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeSMTP.opened = []
+    monkeypatch.setattr(smtp_pool, "SMTP", FakeSMTP)
+    return SMTPConnectionPool("smtp.example.com", 587, username="user", password="secret", max_messages=3)
+
+
+def batch(*recipients):
+    return [("from@example.com", to, "message") for to in recipients]
+
+
+def test_connection_is_reused_between_batches(pool):
+    assert pool.send_many(batch("a@example.com", "b@example.com")) == {}
+    assert pool.send_many(batch("c@example.com")) == {}
+    assert pool.connections_opened == 1
+    assert FakeSMTP.opened[0].sent == ["a@example.com", "b@example.com", "c@example.com"]
+
+
+def test_refused_recipient_keeps_the_connection(pool):
+    failures = pool.send_many(batch("a@example.com", "refused@example.com", "b@example.com"))
+    assert list(failures) == ["refused@example.com"]
+    assert pool.connections_opened == 1 and FakeSMTP.opened[0].sent == ["a@example.com", "b@example.com"]
+
+
+def test_dropped_connection_is_replaced_mid_batch(pool):
+    pool.send_many(batch("a@example.com"))
+    FakeSMTP.opened[0].drop_after = 1
+    assert pool.send_many(batch("b@example.com")) == {}
+    assert pool.connections_opened == 2 and FakeSMTP.opened[1].sent == ["b@example.com"]
+
+
+def test_connection_is_recycled_after_max_messages(pool):
+    pool.send_many(batch("a@example.com", "b@example.com", "c@example.com"))
+    pool.send_many(batch("d@example.com"))
+    assert pool.connections_opened == 2 and FakeSMTP.opened[0].closed
+
+
+def test_throttle_runs_before_every_message(pool):
+    calls = []
+    pool.send_many(batch("a@example.com", "b@example.com"), throttle=lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_template_is_read_once():
+    from email_tasks import tasks
+    tasks.load_confirmation_template.cache_clear()
+    first = tasks.build_confirmation_message("a@example.com", "token-1")
+    tasks.build_confirmation_message("b@example.com", "token-2")
+    assert "/users/confirm/token-1" in first and "{{ confirmation_link }}" not in first
+    assert tasks.load_confirmation_template.cache_info().misses == 1
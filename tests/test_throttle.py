@@ -0,0 +1,23 @@
+import time
+from email_tasks.throttle import TokenBucket, RedisTokenBucket
+
+
+def test_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.08
+
+
+def test_redis_bucket_limits_locally_while_redis_is_down():
+    bucket = RedisTokenBucket("redis://127.0.0.1:1/0", "email:ratelimit:test", rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert 0.08 <= elapsed < 2
+    assert bucket._retry_at > time.monotonic()  # Redis isn't retried on every send
@@ -0,0 +1,58 @@
+import time
+import uuid
+import pytest
+from fastapi import HTTPException
+from app.utlis import security
+from app.utlis.token_cache import VerifiedTokenCache
+from app.utlis.revocation import RevocationStore, MemoryRevocationBackend
+from app.utlis.security import create_access_token, create_refresh_token, verify_token
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = VerifiedTokenCache(max_size=100)
+    monkeypatch.setattr(security, "token_cache", cache)
+    monkeypatch.setattr(security, "revocation_store", RevocationStore(MemoryRevocationBackend()))
+    return cache
+
+
+def test_lru_and_expiry():
+    cache = VerifiedTokenCache(max_size=2)
+    cache.set("a", {"exp": time.time() + 60})
+    cache.set("b", {"exp": time.time() + 60})
+    cache.get("a")
+    cache.set("c", {"exp": time.time() + 60})
+    assert cache.get("b") is None and cache.get("a") is not None
+    cache.set("d", {"exp": time.time() - 1})
+    assert cache.get("d") is None
+    assert VerifiedTokenCache(max_size=0).get("a") is None
+
+
+def test_raw_tokens_are_not_kept():
+    cache = VerifiedTokenCache()
+    cache.set("secret-token", {"exp": None})
+    assert all(isinstance(key, bytes) and len(key) == 32 for key in cache._entries)
+
+
+def test_verify_token_checks_the_signature_once(run, cache):
+    token = create_access_token("a@example.com", str(uuid.uuid4()), is_active=True)
+    first = run(verify_token(f"Bearer {token}"))
+    second = run(verify_token(f"Bearer {token}"))
+    assert first == second and (cache.misses, cache.hits) == (1, 1)
+
+
+def test_cache_hits_still_check_revocation(run, cache):
+    token = create_access_token("a@example.com", str(uuid.uuid4()), is_active=True)
+    payload = run(verify_token(f"Bearer {token}"))
+    run(security.revocation_store.revoke(payload))
+    with pytest.raises(HTTPException) as e:
+        run(verify_token(f"Bearer {token}"))
+    assert e.value.detail == "Token has been revoked."
+
+
+def test_cached_refresh_token_is_still_refused(run, cache):
+    token = create_refresh_token("a@example.com", str(uuid.uuid4()))
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            run(verify_token(f"Bearer {token}"))
+        assert e.value.status_code == 401
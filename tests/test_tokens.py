@@ -0,0 +1,43 @@
+import time
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app.utlis.tokens import TokenService
+
+
+def key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+    public = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                           serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private, public
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return key_pair()
+
+
+def test_sign_and_verify(keys):
+    service = TokenService(*keys)
+    token = service.sign({"uuid": "u", "exp": time.time() + 60})
+    assert jwt.get_unverified_header(token) == {"alg": "RS256", "kid": service.kid, "typ": "JWT"}
+    assert service.verify(token)["uuid"] == "u"
+    # Same token as PyJWT would produce
+    assert jwt.decode(token, keys[1], algorithms=["RS256"])["uuid"] == "u"
+
+
+def test_rejects_tampered_and_expired(keys):
+    service = TokenService(*keys)
+    header, payload, signature = service.sign({"uuid": "u", "exp": time.time() + 60}).split(".")
+    with pytest.raises(jwt.InvalidSignatureError):
+        service.verify(".".join((header, payload, signature[:-4] + "AAAA")))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        service.verify(service.sign({"uuid": "u", "exp": time.time() - 1}))
+
+
+def test_unsupported_algorithm(keys):
+    with pytest.raises(ValueError):
+        TokenService(*keys, algorithm="none-such")
@@ -0,0 +1,140 @@
+import uuid
+import pytest
+from app.models import User, AuthProviderEnum
+from app.utlis.user_cache import UserCache, UserRecord, MemoryCacheBackend
+from app.utlis import users_processing
+
+
+class FakeSession:
+    """Answers every query with `user`, counting the round-trips"""
+
+    def __init__(self, user=None, replica=None):
+        self.user = user
+        self.queries = 0
+        self.info = {"replica": replica} if replica else {}
+
+    async def scalar(self, statement):
+        self.queries += 1
+        if isinstance(self.user, Exception):
+            raise self.user
+        return self.user
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_user(email="a@example.com"):
+    return User(uuid=uuid.uuid4(), email=email, is_active=True, hashed_password="$2b$04$hash", first_name="A",
+                last_name="B", auth_provider=AuthProviderEnum.EMAIL)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = UserCache(MemoryCacheBackend(), write_window=10)
+    monkeypatch.setattr(users_processing, "user_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def primary(monkeypatch):
+    """The session _load_user falls back to"""
+    session = FakeSession(None)
+    monkeypatch.setattr(users_processing, "get_sessionmaker", lambda: lambda: session)
+    return session
+
+
+def test_record_round_trip_leaves_out_the_hash():
+    record = UserRecord.from_user(make_user())
+    loaded = UserRecord.loads(record.dumps())
+    assert (loaded.uuid, loaded.email, loaded.first_name, loaded.auth_provider) == \
+        (record.uuid, record.email, record.first_name, record.auth_provider)
+    assert record.hashed_password and loaded.hashed_password is None
+
+
+def test_unknown_email_is_answered_from_the_cache(run, cache):
+    db = FakeSession(None)
+    assert run(users_processing.get_user_credentials(db, "nobody@example.com")) is None
+    assert run(users_processing.get_user_credentials(db, "nobody@example.com")) is None
+    assert db.queries == 1
+
+
+def test_sign_up_clears_the_unknown_email_entry(run, cache):
+    run(users_processing.get_user_credentials(FakeSession(None), "new@example.com"))
+    run(cache.invalidate(None, "new@example.com"))
+    db = FakeSession(make_user("new@example.com"))
+    record = run(users_processing.get_user_credentials(db, "new@example.com"))
+    assert db.queries == 1 and record.hashed_password == "$2b$04$hash"
+
+
+def test_credentials_always_come_from_the_database(run, cache):
+    db = FakeSession(make_user())
+    run(users_processing.get_user_credentials(db, "a@example.com"))
+    run(users_processing.get_user_credentials(db, "a@example.com"))
+    assert db.queries == 2
+
+
+def test_uuid_lookup_is_cached(run, cache):
+    user = make_user()
+    db = FakeSession(user)
+    first = run(users_processing.get_user_record_by_uuid(db, user.uuid))
+    second = run(users_processing.get_user_record_by_uuid(db, user.uuid))
+    assert db.queries == 1 and first.email == second.email == "a@example.com"
+
+
+def test_load_started_before_an_invalidate_is_not_cached(run, cache):
+    record = UserRecord.from_user(make_user())
+    generation = cache.generation()
+    run(cache.invalidate(record.uuid, record.email))
+    run(cache.set(record, generation))
+    assert run(cache.get_by_uuid(record.uuid)) == (False, None)
+
+    run(cache.set(record, cache.generation()))
+    assert run(cache.get_by_uuid(record.uuid))[0]
+
+
+def test_memory_backend_expires_and_evicts(run, monkeypatch):
+    backend = MemoryCacheBackend(max_size=2)
+    run(backend.set("a", "1", 60))
+    run(backend.set("b", "2", 60))
+    run(backend.get("a"))  # Most recently used now
+    run(backend.set("c", "3", 60))
+    assert run(backend.get("b")) is None and run(backend.get("a")) == "1"
+    run(backend.set("d", "4", 0))
+    assert run(backend.get("d")) is None
+
+
+def test_login_reads_the_hash_from_a_replica(run, cache, primary):
+    replica = FakeSession(make_user(), replica="replica-1")
+    record = run(users_processing.get_user_credentials(replica, "a@example.com"))
+    assert record.hashed_password == "$2b$04$hash"
+    assert (replica.queries, primary.queries) == (1, 0)
+
+
+def test_recently_changed_password_is_read_from_the_primary(run, cache, primary):
+    replica = FakeSession(make_user(), replica="replica-1")
+    primary.user = make_user()
+    primary.user.hashed_password = "$2b$04$changed"
+    run(cache.invalidate(None, "a@example.com"))  # Password change
+    record = run(users_processing.get_user_credentials(replica, "a@example.com"))
+    assert record.hashed_password == "$2b$04$changed"
+    assert (replica.queries, primary.queries) == (0, 1)
+
+
+def test_replica_miss_falls_back_to_the_primary(run, cache, primary):
+    primary.user = make_user("new@example.com")
+    replica = FakeSession(None, replica="replica-1")
+    record = run(users_processing.get_user_credentials(replica, "new@example.com"))
+    assert record.email == "new@example.com"
+    assert (replica.queries, primary.queries) == (1, 1)
+
+
+def test_failing_replica_is_ejected(run, cache, primary, monkeypatch):
+    ejected = []
+    monkeypatch.setattr(users_processing.replica_router, "eject", lambda name, error: ejected.append(name))
+    primary.user = make_user()
+    replica = FakeSession(OSError("connection reset"), replica="replica-1")
+    record = run(users_processing.get_user_record_by_uuid(replica, primary.user.uuid))
+    assert record.email == "a@example.com" and ejected == ["replica-1"]
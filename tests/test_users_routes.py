@@ -0,0 +1,111 @@
+import uuid
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from app.models import User, AuthProviderEnum
+from app.schemas import EmailUpdate, UserUpdate, UserCreate
+from app.routes import users
+from app.utlis import users_processing
+from app.utlis.user_cache import UserCache, UserRecord, MemoryCacheBackend
+
+
+class Session:
+    """Primary session double: `taken` answers the email check, `conflict` makes the commit hit the unique index"""
+    info = {}
+
+    def __init__(self, taken=False, conflict=False):
+        self.taken = taken
+        self.conflict = conflict
+        self.commits = 0
+        self.rollbacks = 0
+        self.executed = []
+
+    async def scalar(self, statement):
+        return 1 if self.taken else None
+
+    async def execute(self, statement):
+        self.executed.append(statement)
+        if self.conflict:
+            raise IntegrityError(str(statement), {}, Exception("duplicate key value violates unique constraint"))
+        return Result(uuid.uuid4())
+
+    async def commit(self):
+        if self.conflict:
+            raise IntegrityError("COMMIT", {}, Exception("duplicate key value violates unique constraint"))
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    async def refresh(self, instance):
+        pass
+
+
+class Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = UserCache(MemoryCacheBackend())
+    monkeypatch.setattr(users, "user_cache", cache)
+    monkeypatch.setattr(users_processing, "user_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def user():
+    return User(uuid=uuid.uuid4(), email="a@example.com", is_active=True, first_name="A", last_name="B",
+                auth_provider=AuthProviderEnum.EMAIL)
+
+
+def test_email_change_conflict_is_a_400(run, cache, user):
+    db = Session(conflict=True)
+    run(cache.set(UserRecord.from_user(user)))
+    with pytest.raises(HTTPException) as e:
+        run(users.update_email(EmailUpdate(new_email="b@example.com"), db, user))
+    assert (e.value.status_code, e.value.detail) == (400, "Email already registered")
+    assert db.rollbacks == 1
+    assert run(cache.get_by_uuid(user.uuid))[0]  # Nothing changed, nothing invalidated
+
+
+def test_profile_update_conflict_is_a_400(run, cache, user):
+    with pytest.raises(HTTPException) as e:
+        run(users.update_user(UserUpdate(email="b@example.com"), Session(conflict=True), user))
+    assert e.value.status_code == 400
+
+
+def test_taken_email_is_rejected_before_the_commit(run, cache, user):
+    db = Session(taken=True)
+    with pytest.raises(HTTPException):
+        run(users.update_email(EmailUpdate(new_email="b@example.com"), db, user))
+    assert db.commits == 0
+
+
+def test_email_change_invalidates_both_emails(run, cache, user):
+    run(cache.set_missing_email("b@example.com"))
+    run(cache.set(UserRecord.from_user(user)))
+    response = run(users.update_email(EmailUpdate(new_email="b@example.com"), Session(), user))
+    assert response.status_code == 200
+    assert run(cache.get_by_email("a@example.com")) == (False, None)
+    assert run(cache.get_by_email("b@example.com")) == (False, None)
+
+
+def test_stale_cached_duplicate_does_not_block_sign_up(run, cache, user):
+    # Cached on this worker, deleted on another: the primary says the email is free again
+    run(cache.set(UserRecord.from_user(user)))
+    db = Session(taken=False)
+    created, _ = run(users_processing.process_user_creation(
+        db, UserCreate(email="a@example.com", first_name="A", last_name="B", password="secret")))
+    assert created and db.commits == 1
+
+
+def test_third_party_id_conflict_is_a_400(run, cache):
+    with pytest.raises(HTTPException) as e:
+        run(users_processing.process_user_creation(Session(conflict=True), UserCreate(
+            email="c@example.com", first_name="C", last_name="D", third_party_id="g-1", auth_provider="google")))
+    assert (e.value.status_code, e.value.detail) == (400, "Account already registered")